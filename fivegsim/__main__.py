@@ -5,14 +5,29 @@
 #
 # Authors: Christian Menard
 
+import importlib
+import sys
+
 import hydra
 
-from mocasin.tasks.simulate import simulate
+from fivegsim.tasks import _tasks
+
+
+def main():
+    # The first argument optionally selects a task. If no task is given, we
+    # run the simulation. All other arguments are passed on to hydra.
+    task = "simulate"
+    if len(sys.argv) > 1 and sys.argv[1] in _tasks:
+        task = sys.argv.pop(1)
+
+    module_name, function_name, config_name, _ = _tasks[task]
+    function = getattr(importlib.import_module(module_name), function_name)
 
+    @hydra.main(config_path="conf", config_name=config_name)
+    def run(cfg):
+        function(cfg)
 
-@hydra.main(config_path="conf", config_name="fivegsim")
-def main(cfg):
-    simulate(cfg)
+    run()
 
 
 if __name__ == "__main__":
@@ -132,6 +132,29 @@ class FivegGraph(DataflowGraph):
         for c in channels:
             self.add_channel(channels[c])
 
+    def process_cycles(self, trace):
+        """Get the processor cycles of each process.
+
+        All instances of a subkernel have the same execution behavior. Thus,
+        the trace is only queried once per subkernel.
+
+        Args:
+            trace (DataflowTrace): the trace of the application
+
+        Returns:
+            dict: a dict mapping process names to a dict of processor cycles
+                per processor type
+        """
+        cycles = {}
+        for phase in self.structure.values():
+            for subkernel in phase["subkernels"]:
+                subkernel_cycles = trace.accumulate_processor_cycles(
+                    f"{subkernel}0"
+                )
+                for i in range(phase["num_instances"]):
+                    cycles[f"{subkernel}{i}"] = subkernel_cycles
+        return cycles
+
     @property
     def timeout(self):
         """Return timeout of the application (in ps)."""
@@ -145,6 +168,17 @@ class FivegGraph(DataflowGraph):
             raise ValueError("Unknown criticality")
         return timeout
 
+    @property
+    def priority(self):
+        """Return the scheduling priority of the application.
+
+        Applications with a higher priority are more urgent. Criticality 1
+        applications have the tightest deadline and get the highest priority.
+        """
+        if self.criticality == 1:
+            return 1
+        return 0
+
     @staticmethod
     def from_hydra(id, prbs, modulation_scheme, layers, antennas, **kwargs):
         # a little hacky, but it does the trick to instantiate the graph
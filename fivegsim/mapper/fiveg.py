@@ -4,6 +4,8 @@
 # Authors: Robert Khasanov
 
 from collections import Counter
+import heapq
+import itertools
 import logging
 
 from mocasin.common.mapping import Mapping, ProcessMappingInfo
@@ -15,6 +17,36 @@ from mocasin.mapper.random import RandomPartialMapper
 log = logging.getLogger(__name__)
 
 
+def _heap_top(heap, is_valid):
+    """Get the processor at the top of a heap with lazy deletion.
+
+    Outdated entries at the top of the heap are dropped.
+
+    Returns:
+        The processor of the top entry or None if the heap is empty.
+    """
+    while heap and not is_valid(heap[0]):
+        heapq.heappop(heap)
+    return heap[0][2] if heap else None
+
+
+def _core_counts(num_cores):
+    """Get the numbers of cores of a type to consider for a Pareto front.
+
+    The numbers grow geometrically (1, 2, 4, ...) and always include all
+    cores, such that the number of candidates only grows logarithmically
+    with the number of cores.
+    """
+    counts = [0]
+    count = 1
+    while count < num_cores:
+        counts.append(count)
+        count *= 2
+    if num_cores > 0:
+        counts.append(num_cores)
+    return counts
+
+
 class FiveGMapper(BaseMapper):
     """FiveG-specific mapper.
 
@@ -27,17 +59,24 @@ class FiveGMapper(BaseMapper):
     process (as they were fused). The processes in the single phase processing
     the different portion of the input are distributed among all available cores
     in balanced fashion.
+
+    Args:
+        platform (Platform): the platform to map to
+        native_pareto (bool): if set, :meth:`generate_pareto_front` enumerates
+            core subsets and evaluates them with the load balancing heuristic
+            directly, instead of using the generic implementation of
+            :class:`BaseMapper`.
     """
 
-    def __init__(self, platform):
+    def __init__(self, platform, native_pareto=False):
         super().__init__(platform, True)
+        self.native_pareto = native_pareto
         self.randMapGen = RandomPartialMapper(self.platform)
         self.comMapGen = ComPartialMapper(self.platform, self.randMapGen)
 
-    def _map_to_core(self, mapping, process, core):
+    def _map_to_core(self, mapping, process, core, priority=0):
         scheduler = list(self.platform.schedulers())[0]
         affinity = core
-        priority = 0
         info = ProcessMappingInfo(scheduler, affinity, priority)
         mapping.add_process_info(process, info)
 
@@ -50,16 +89,32 @@ class FiveGMapper(BaseMapper):
         phase,
         acc_kernels,
         processor_time,
+        processes,
+        base_time=None,
     ):
-        """Remap fft nodes to accelerators.
+        """Remap the given subkernels to a pool of accelerators.
 
         Remapping is done iteratively, the algorithm takes the generic core with
         the longest execution time and remaps it to the accelerator with the
         least execution time.
+
+        If ``base_time`` is given, all times are absolute. The phase starts
+        once the first regular processor becomes available, thus an
+        accelerator is not available before this time plus the offset of the
+        accelerated subkernel, or before it finished its previous work.
+
+        The processors are kept in priority queues, which are updated
+        incrementally after each move. Entries are invalidated lazily: an
+        entry is outdated if its time differs from the current processor time.
+        Ties are broken by the processor order. Thus, the result is identical to
+        scanning all processors in each iteration.
         """
         num_instances = graph.structure[phase]["num_instances"]
         subkernels = graph.structure[phase]["subkernels"]
-        regular_processors = list(processor_time.keys())
+        # processor_time may already contain the accelerators of other pools
+        regular_processors = [
+            pe for pe in processor_time if not pe.type.startswith("acc:")
+        ]
 
         # Before fft there might be some other processes, during this time
         # the accelerator is idle
@@ -74,8 +129,13 @@ class FiveGMapper(BaseMapper):
                 [pe.ticks(acc_cycles[pe.type]) for pe in regular_processors]
             )
 
+        phase_start = 0
+        if base_time is not None:
+            phase_start = min(base_time[pe] for pe in regular_processors)
         for acc in accelerators:
-            processor_time[acc] = offset
+            processor_time[acc] = phase_start + offset
+            if base_time is not None:
+                processor_time[acc] = max(processor_time[acc], base_time[acc])
 
         for subkernel in subkernels:
             if subkernel not in acc_kernels:
@@ -88,7 +148,7 @@ class FiveGMapper(BaseMapper):
                 pe: [] for pe in regular_processors + accelerators
             }
             for i in range(num_instances):
-                process = graph.find_process(f"{subkernel}{i}")
+                process = processes[f"{subkernel}{i}"]
                 pe = mapping_dict[process]
                 subkernel_instances[pe].append(process)
             # pe -> time of subkernel
@@ -96,42 +156,107 @@ class FiveGMapper(BaseMapper):
             for pe in regular_processors + accelerators:
                 subkernel_time[pe] = pe.ticks(acc_cycles[pe.type])
 
+            def is_valid_max(entry):
+                return -entry[0] == processor_time[entry[2]]
+
+            def is_valid_min(entry):
+                return entry[0] == processor_time[entry[2]]
+
+            def is_valid_busy(entry):
+                return is_valid_max(entry) and subkernel_instances[entry[2]]
+
+            # regular processors with instances of the subkernel (max-heap)
+            busy_heap = [
+                (-processor_time[pe], idx, pe)
+                for idx, pe in enumerate(regular_processors)
+                if subkernel_instances[pe]
+            ]
+            # all regular processors (max-heap)
+            regular_heap = [
+                (-processor_time[pe], idx, pe)
+                for idx, pe in enumerate(regular_processors)
+            ]
+            # all accelerators (min-heap and max-heap)
+            acc_min_heap = [
+                (processor_time[pe], idx, pe)
+                for idx, pe in enumerate(accelerators)
+            ]
+            acc_max_heap = [
+                (-processor_time[pe], idx, pe)
+                for idx, pe in enumerate(accelerators)
+            ]
+            for heap in (busy_heap, regular_heap, acc_min_heap, acc_max_heap):
+                heapq.heapify(heap)
+            regular_idx = {pe: idx for idx, pe in enumerate(regular_processors)}
+            acc_idx = {pe: idx for idx, pe in enumerate(accelerators)}
+
             while True:
-                filtered_processors = [
-                    pe for pe in regular_processors if subkernel_instances[pe]
-                ]
-                if not filtered_processors:
+                pe_max = _heap_top(busy_heap, is_valid_busy)
+                if pe_max is None:
                     break
-                pe_max = max(filtered_processors, key=processor_time.get)
-                acc_min = min(accelerators, key=processor_time.get)
-                assert pe_max in regular_processors
+                acc_min = _heap_top(acc_min_heap, is_valid_min)
+
+                # tentatively migrate an instance
+                pe_max_time = processor_time[pe_max]
+                acc_min_time = processor_time[acc_min]
+                processor_time[pe_max] -= subkernel_time[pe_max]
+                processor_time[acc_min] += subkernel_time[acc_min]
+                heapq.heappush(
+                    regular_heap,
+                    (-processor_time[pe_max], regular_idx[pe_max], pe_max),
+                )
+                heapq.heappush(
+                    acc_min_heap,
+                    (processor_time[acc_min], acc_idx[acc_min], acc_min),
+                )
+                heapq.heappush(
+                    acc_max_heap,
+                    (-processor_time[acc_min], acc_idx[acc_min], acc_min),
+                )
 
                 # check that after miggration accelerator time will not exceed
                 # the processor time
-                moved_processor_time = processor_time.copy()
-                moved_processor_time[pe_max] -= subkernel_time[pe_max]
-                moved_processor_time[acc_min] += subkernel_time[acc_min]
-                new_pe_max = max(
-                    moved_processor_time, key=moved_processor_time.get
-                )
-                if new_pe_max in regular_processors:
-                    processor_time[pe_max] -= subkernel_time[pe_max]
-                    processor_time[acc_min] += subkernel_time[acc_min]
+                new_regular_max = _heap_top(regular_heap, is_valid_max)
+                new_acc_max = _heap_top(acc_max_heap, is_valid_max)
+                if (
+                    processor_time[new_regular_max]
+                    >= processor_time[new_acc_max]
+                ):
                     process = subkernel_instances[pe_max].pop()
                     subkernel_instances[acc_min].append(process)
                     mapping_dict[process] = acc_min
+                    heapq.heappush(
+                        busy_heap,
+                        (-processor_time[pe_max], regular_idx[pe_max], pe_max),
+                    )
                 else:
+                    # revert the migration
+                    processor_time[pe_max] = pe_max_time
+                    processor_time[acc_min] = acc_min_time
                     break
 
         return processor_time
 
-    def _map_phase(self, graph, trace, mapping_dict, phase, processors):
+    def _map_phase(
+        self,
+        graph,
+        trace,
+        mapping_dict,
+        phase,
+        processors,
+        processes,
+        base_time=None,
+    ):
         """Map processes in the specific phase.
 
         Args:
             mapping_dict (dict): currently constructed mapping_dict
             phase (str): a phase name
             processors (list of `Processor`): a list of processors to map to.
+            processes (dict): a dict mapping process names to processes
+            base_time (Counter): the time already spent on each processor
+                by other applications. If given, the time of each processor
+                that executes a process of the phase is updated in place.
 
         Returns: a tuple (execution time, dynamic energy) of the phase
         """
@@ -145,6 +270,9 @@ class FiveGMapper(BaseMapper):
         ]
         # execution time of already mapped processes
         processor_time = Counter(dict.fromkeys(regular_processors, 0))
+        if base_time is not None:
+            for pe in regular_processors:
+                processor_time[pe] = base_time[pe]
 
         # collect the amount of cycles at each core for the whole kernel
         acc_cycles = Counter()
@@ -171,50 +299,93 @@ class FiveGMapper(BaseMapper):
         for pe in regular_processors:
             phase_processor_time[pe] = pe.ticks(phase_processor_cycles[pe])
 
-        # perform load balancing
+        # perform load balancing (longest processing time first). Each
+        # instance is assigned to the processor that finishes it first, ties
+        # are broken by the order of the processors. Processors without any
+        # execution time for the phase (e.g. due to missing cost information)
+        # are not considered.
         processor_instances = dict.fromkeys(regular_processors, 0)
+        heap = [
+            (processor_time[pe] + phase_processor_time[pe], idx, pe)
+            for idx, pe in enumerate(regular_processors)
+            if phase_processor_time[pe] > 0
+        ]
+        heapq.heapify(heap)
         for _ in range(num_instances):
-            pe_time_added = processor_time + phase_processor_time
-            pe_min = min(
-                pe_time_added,
-                key=pe_time_added.get,
-                default=regular_processors[0],
-            )
+            if not heap:
+                processor_instances[regular_processors[0]] += num_instances
+                break
+            _, idx, pe_min = heap[0]
             processor_instances[pe_min] += 1
             processor_time[pe_min] += phase_processor_time[pe_min]
+            heapq.heapreplace(
+                heap,
+                (
+                    processor_time[pe_min] + phase_processor_time[pe_min],
+                    idx,
+                    pe_min,
+                ),
+            )
 
         # assign cores to the processes
         i = 0
         for pe, count in processor_instances.items():
             for _ in range(count):
                 for subkernel in subkernels:
-                    process = graph.find_process(f"{subkernel}{i}")
+                    process = processes[f"{subkernel}{i}"]
                     mapping_dict[process] = pe
                 i += 1
 
         assert i == num_instances
 
-        # remap to accelerators
-        accelerators = [pe for pe in processors if pe.type.startswith("acc:")]
-        if accelerators:
-            assert len(set(pe.type for pe in accelerators)) == 1
-            acc_kernels = accelerators[0].type[4:].split(",")
-            if any(subkernel in acc_kernels for subkernel in subkernels):
-                processor_time = self._remap_accelerators(
-                    graph,
-                    trace,
-                    mapping_dict,
-                    accelerators,
-                    phase,
-                    acc_kernels,
-                    processor_time,
-                )
+        # remap to accelerators. The accelerators are grouped into pools by
+        # their type, and each subkernel is only remapped to the first pool
+        # that supports it.
+        pools = {}
+        for pe in processors:
+            if pe.type.startswith("acc:"):
+                pools.setdefault(pe.type, []).append(pe)
+        remapped_kernels = set()
+        for acc_type, accelerators in pools.items():
+            acc_kernels = [
+                kernel
+                for kernel in acc_type[4:].split(",")
+                if kernel in subkernels and kernel not in remapped_kernels
+            ]
+            if not acc_kernels:
+                continue
+            remapped_kernels.update(acc_kernels)
+            processor_time = self._remap_accelerators(
+                graph,
+                trace,
+                mapping_dict,
+                accelerators,
+                phase,
+                acc_kernels,
+                processor_time,
+                processes,
+                base_time,
+            )
 
         exec_time = max(processor_time.values(), default=0)
         # estimate energy
         dynamic_energy = 0
         for pe in regular_processors:
-            dynamic_energy += processor_time[pe] * pe.dynamic_power()
+            phase_time = processor_time[pe]
+            if base_time is not None:
+                phase_time -= base_time[pe]
+            dynamic_energy += phase_time * pe.dynamic_power()
+
+        # only processors that received work are busy for longer, an idle
+        # accelerator does not wait for the phase
+        if base_time is not None:
+            used = {
+                mapping_dict[processes[f"{subkernel}{i}"]]
+                for subkernel in subkernels
+                for i in range(num_instances)
+            }
+            for pe in used:
+                base_time[pe] = processor_time[pe]
 
         return exec_time, dynamic_energy
 
@@ -248,6 +419,32 @@ class FiveGMapper(BaseMapper):
         if not regular_processors:
             return None
 
+        # index the processes by name
+        processes = {p.name: p for p in graph.processes()}
+
+        mapping_dict, exec_time, dynamic_energy = self._balance(
+            graph, trace, processors, processes
+        )
+        return self._create_mapping(
+            graph,
+            trace,
+            representation,
+            mapping_dict,
+            exec_time,
+            dynamic_energy,
+        )
+
+    def _balance(self, graph, trace, processors, processes, load=None):
+        """Balance the processes of a graph across the given processors.
+
+        Args:
+            load (Counter): the time already spent on each processor by other
+                applications. If given, the processes are balanced on top of
+                this load, which is updated in place, and the execution time
+                is the maximum load of all processors used by the graph.
+
+        Returns: a tuple (mapping dict, execution time, dynamic energy)
+        """
         exec_time = 0
         dynamic_energy = 0
 
@@ -256,14 +453,29 @@ class FiveGMapper(BaseMapper):
         # map applications phase by phase
         for phase in graph.structure:
             phase_results = self._map_phase(
-                graph, trace, mapping_dict, phase, processors
+                graph, trace, mapping_dict, phase, processors, processes, load
             )
             exec_time += phase_results[0]
             dynamic_energy += phase_results[1]
 
+        if load is not None:
+            exec_time = max(load[pe] for pe in set(mapping_dict.values()))
+
+        return mapping_dict, exec_time, dynamic_energy
+
+    def _create_mapping(
+        self,
+        graph,
+        trace,
+        representation,
+        mapping_dict,
+        exec_time,
+        energy,
+    ):
+        """Create a full mapping from a dict of processes to processors."""
         mapping = Mapping(graph, self.platform)
         for process, pe in mapping_dict.items():
-            self._map_to_core(mapping, process, pe)
+            self._map_to_core(mapping, process, pe, graph.priority)
         mapping = self.comMapGen.generate_mapping(
             graph,
             trace=trace,
@@ -272,5 +484,119 @@ class FiveGMapper(BaseMapper):
         )
 
         mapping.metadata.exec_time = exec_time / 1000000000.0
-        mapping.metadata.energy = dynamic_energy / 1000000000.0
+        mapping.metadata.energy = energy / 1000000000.0
         return mapping
+
+    def generate_joint_mappings(self, graphs, traces, processors=None):
+        """Generate mappings for multiple graphs that execute concurrently.
+
+        The graphs are mapped one after another in the order of their
+        deadlines (:attr:`FivegGraph.timeout`), such that the graphs with the
+        tightest deadlines are mapped first and get the least loaded
+        processors. The phases of each graph are balanced on top of the load
+        of all graphs mapped before. The deadlines only determine this order,
+        they do not weight the load balancing itself.
+
+        Args:
+            graphs (list of FivegGraph): the graphs to map
+            traces (list of FivegTrace): the traces of the graphs
+            processors (list of Processor): the processors to map to. All
+                processors of the platform are used if None.
+
+        Returns:
+            list of Mapping: a mapping for each graph, in the order of graphs
+        """
+        if processors is None:
+            processors = list(self.platform.processors())
+
+        load = Counter(dict.fromkeys(processors, 0))
+        mappings = [None] * len(graphs)
+        order = sorted(range(len(graphs)), key=lambda i: graphs[i].timeout)
+        for i in order:
+            graph = graphs[i]
+            processes = {p.name: p for p in graph.processes()}
+            mapping_dict, exec_time, dynamic_energy = self._balance(
+                graph, traces[i], processors, processes, load
+            )
+            mappings[i] = self._create_mapping(
+                graph, traces[i], None, mapping_dict, exec_time, dynamic_energy
+            )
+        return mappings
+
+    def generate_pareto_front(self, graph, trace=None, representation=None):
+        """Generate a Pareto front of mappings for the graph.
+
+        If ``native_pareto`` is set, the front is generated analytically. For
+        each combination of the number of cores per core type (e.g. k big and
+        j little cores), with either no accelerators, all accelerators of a
+        single type or all accelerators, the processes are balanced with the
+        load balancing heuristic. Only the numbers of cores 1, 2, 4, ... and
+        all cores of a type are considered, which bounds the number of
+        candidates on platforms with many cores. The energy of each candidate
+        includes the static energy of the used processors during the
+        execution. Only the non-dominated candidates are turned into mappings.
+
+        Args:
+        :param graph: a dataflow graph
+        :type graph: DataflowGraph
+        :param trace: a trace generator
+        :type trace: TraceGenerator
+        :param representation: a mapping representation object
+        :type representation: MappingRepresentation
+        """
+        if not self.native_pareto:
+            return super().generate_pareto_front(
+                graph, trace=trace, representation=representation
+            )
+
+        # group the processors by type
+        core_types = {}
+        acc_types = {}
+        for pe in self.platform.processors():
+            if pe.type.startswith("acc:"):
+                acc_types.setdefault(pe.type, []).append(pe)
+            else:
+                core_types.setdefault(pe.type, []).append(pe)
+        acc_options = [[]] + list(acc_types.values())
+        if len(acc_types) > 1:
+            acc_options.append([pe for pes in acc_types.values() for pe in pes])
+
+        # index the processes by name
+        processes = {p.name: p for p in graph.processes()}
+
+        candidates = []
+        for counts in itertools.product(
+            *(_core_counts(len(pes)) for pes in core_types.values())
+        ):
+            if not any(counts):
+                continue
+            cores = []
+            for pes, count in zip(core_types.values(), counts):
+                cores.extend(pes[:count])
+            for accelerators in acc_options:
+                mapping_dict, exec_time, dynamic_energy = self._balance(
+                    graph, trace, cores + accelerators, processes
+                )
+                static_power = sum(
+                    pe.static_power() for pe in set(mapping_dict.values())
+                )
+                energy = dynamic_energy + static_power * exec_time
+                candidates.append((exec_time, energy, mapping_dict))
+
+        # keep the non-dominated candidates
+        candidates.sort(key=lambda c: (c[0], c[1]))
+        pareto_candidates = []
+        for candidate in candidates:
+            if not pareto_candidates or candidate[1] < pareto_candidates[-1][1]:
+                pareto_candidates.append(candidate)
+        log.debug(
+            f"Evaluated {len(candidates)} candidates, "
+            f"{len(pareto_candidates)} are Pareto-optimal"
+        )
+
+        return [
+            self._create_mapping(
+                graph, trace, representation, mapping_dict, exec_time, energy
+            )
+            for exec_time, energy, mapping_dict in pareto_candidates
+        ]
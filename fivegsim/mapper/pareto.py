@@ -3,17 +3,84 @@
 #
 # Authors: Robert Khasanov
 
+import copy
+import logging
+import os
+import re
+
 import hydra
 
+from mocasin.common.mapping import ProcessMappingInfo
 from mocasin.mapper.partial import (
     ComFullMapper,
     ProcPartialMapper,
 )
 from mocasin.mapper.utils import SimulationManager
 
+from fivegsim.trace import FivegTrace
+from fivegsim.util.cache import (
+    atomic_pickle_dump,
+    config_hash,
+    package_sources,
+    package_version,
+    pickle_load,
+)
+from fivegsim.util.cost_model import get_task_costs
+from fivegsim.util.trace_file_manager import TraceFileManager
+
+log = logging.getLogger(__name__)
+
 
 class FiveGParetoFrontCache:
-    """FiveG Pareto-Front Cache."""
+    """FiveG Pareto-Front Cache.
+
+    The Pareto fronts are cached in memory for the lifetime of the cache
+    object. If ``pareto_cache_dir`` is set, the fronts are additionally stored
+    on disk, such that subsequent runs can reuse them. The fronts are stored in
+    a subdirectory named by a hash of all configuration values that affect the
+    generated fronts, the task file and the fivegsim sources, with one file
+    per graph invariant. The fronts are further separated by the mocasin
+    version, as the mappers and the simulation are part of mocasin.
+
+    Graphs with the same invariant have identical process and channel names.
+    Thus, the mappings of an invariant are materialized only once and then
+    bound to each requesting graph by a shallow copy.
+
+    Large fronts increase the scheduling time of TETRiS. The fronts may be
+    thinned after generation by setting ``pareto_epsilon`` or
+    ``pareto_max_points``. With ``pareto_epsilon``, a mapping is dropped if
+    another mapping is at most a factor of ``1 + pareto_epsilon`` worse in
+    both execution time and energy. With ``pareto_max_points``, at most this
+    many mappings are kept, spread evenly along the time/energy curve. The
+    fastest and the most energy-efficient mapping are always kept, unless
+    ``pareto_max_points`` is 1, which only keeps the fastest mapping.
+
+    The fronts of graphs that only differ in the number of PRBs have the same
+    structure. If ``pareto_prb_interpolation`` is set, the front of a new
+    invariant is estimated from the cached front with the nearest number of
+    PRBs. The mappings are reused. Their execution time and dynamic energy
+    are rescaled by the ratio of the processor loads under both PRB values,
+    while the static energy follows the rescaled execution time. A full
+    generation is only performed if the execution times of the processes do
+    not scale uniformly, i.e., if the relative spread of their scaling
+    factors exceeds ``pareto_interpolation_max_error``. This spread bounds
+    the relative error of the estimate (see :meth:`_interpolate`).
+    Interpolated fronts are not stored on disk.
+    """
+
+    # configuration keys that affect the generated Pareto fronts
+    _config_keys = [
+        "platform",
+        "mapper",
+        "representation",
+        "antennas",
+        "cost_model",
+        "pareto_metadata_simulate",
+        "pareto_time_scale",
+        "pareto_time_offset",
+        "pareto_epsilon",
+        "pareto_max_points",
+    ]
 
     def __init__(self, platform, cfg):
         self.platform = platform
@@ -21,40 +88,279 @@ class FiveGParetoFrontCache:
         self.pareto_metadata_simulate = cfg["pareto_metadata_simulate"]
         self.pareto_time_scale = cfg["pareto_time_scale"] * 1.0
         self.pareto_time_offset = cfg["pareto_time_offset"] * 1.0
+        self.pareto_epsilon = cfg["pareto_epsilon"]
+        self.pareto_max_points = cfg["pareto_max_points"]
+        self.pareto_prb_interpolation = cfg["pareto_prb_interpolation"]
+        self.pareto_interpolation_max_error = cfg[
+            "pareto_interpolation_max_error"
+        ]
         self._cache = {}
+        # materialized mappings for each invariant
+        self._mappings = {}
+        # the task execution times, only loaded for interpolation
+        self._proc_time = None
 
         assert isinstance(self.pareto_metadata_simulate, bool)
         assert isinstance(self.pareto_time_scale, float)
         assert isinstance(self.pareto_time_offset, float)
+        assert self.pareto_epsilon is None or self.pareto_epsilon >= 0
+        assert self.pareto_max_points is None or self.pareto_max_points > 0
+
+        self._cache_dir = None
+        if cfg["pareto_cache_dir"]:
+            task_file = hydra.utils.to_absolute_path(cfg["task_file"])
+            digest = config_hash(
+                cfg,
+                self._config_keys,
+                files=[task_file] + package_sources(),
+            )
+            self._cache_dir = os.path.join(
+                hydra.utils.to_absolute_path(cfg["pareto_cache_dir"]),
+                f"mocasin-{package_version('mocasin')}",
+                digest,
+            )
+            os.makedirs(self._cache_dir, exist_ok=True)
+            log.info(f"Using the Pareto front cache in {self._cache_dir}")
 
     def _get_graph_invariant(self, graph):
         """Get the internal graph invariant based on its properies."""
         return f"fiveg_prbs{graph.prbs}_mod{graph.mod}_lay{graph.layers}"
 
+    @staticmethod
+    def _parse_graph_invariant(invariant):
+        """Get the PRBs, modulation scheme and layers of an invariant."""
+        match = re.fullmatch(r"fiveg_prbs(\d+)_mod(\d+)_lay(\d+)", invariant)
+        return tuple(int(g) for g in match.groups())
+
     def get_pareto_front(self, graph, trace):
         """Get Pareto-Front for a given graph and trace."""
         invariant = self._get_graph_invariant(graph)
-        if invariant in self._cache:
-            pareto_front = self._to_mappings(graph, self._cache[invariant])
-        else:
-            pareto_front = self._generate_pareto_front(graph, trace)
-            self._cache[invariant] = self._to_lists(pareto_front)
-        return pareto_front
+        if invariant not in self._mappings:
+            if invariant not in self._cache and self._cache_dir:
+                self._load(invariant)
+            if invariant in self._cache:
+                self._mappings[invariant] = self._to_mappings(
+                    graph, self._cache[invariant]
+                )
+            elif not (
+                self.pareto_prb_interpolation
+                and self._interpolate(invariant, graph, trace)
+            ):
+                pareto_front = self._generate_pareto_front(graph, trace)
+                self._cache[invariant] = self._to_lists(pareto_front)
+                if self._cache_dir:
+                    self._store(invariant)
+                self._mappings[invariant] = pareto_front
+        return [self._bind(m, graph) for m in self._mappings[invariant]]
+
+    def _bind(self, mapping, graph):
+        """Bind a cached mapping to a graph with the same invariant.
+
+        The process and channel infos of a mapping are stored by name. Thus,
+        the bound mapping can share the channel infos with the cached mapping
+        and only the graph, the metadata and the process priorities (which
+        depend on the criticality of the graph) need to be replaced.
+        """
+        bound = copy.copy(mapping)
+        bound.graph = graph
+        bound.metadata = copy.copy(mapping.metadata)
+        # FIXME: accessing private member
+        bound._process_info = {
+            name: ProcessMappingInfo(
+                info.scheduler, info.affinity, graph.priority
+            )
+            for name, info in mapping._process_info.items()
+        }
+        return bound
+
+    def _interpolate(self, invariant, graph, trace):
+        """Estimate the Pareto front of an invariant from a nearby PRB value.
+
+        Let ``r_min`` and ``r_max`` be the smallest and largest ratio of the
+        execution time of a process under the new and the base PRB value. The
+        makespan of a fixed mapping is monotone in the process execution
+        times and scales linearly if all of them are scaled by the same
+        factor. Thus, the new makespan lies between ``r_min`` and ``r_max``
+        times the base makespan. The estimate scales the base makespan by the
+        ratio of the maximum processor load, which lies in the same interval.
+        Hence, the relative error of the execution time and of the static
+        energy is at most ``r_max / r_min - 1``. The dynamic energy is the sum
+        of the processor loads weighted by their dynamic power and is scaled
+        exactly. Communication costs are not rescaled and are not covered by
+        this bound.
+
+        Returns:
+            bool: True if an interpolated front was added to the cache
+        """
+        prbs, mod, layers = self._parse_graph_invariant(invariant)
+        neighbours = []
+        for other in self._cache:
+            other_prbs, other_mod, other_layers = self._parse_graph_invariant(
+                other
+            )
+            if other_mod == mod and other_layers == layers:
+                neighbours.append((abs(other_prbs - prbs), other_prbs, other))
+        if not neighbours:
+            return False
+        _, base_prbs, base_invariant = min(neighbours)
+
+        if base_invariant not in self._mappings:
+            self._mappings[base_invariant] = self._to_mappings(
+                graph, self._cache[base_invariant]
+            )
+
+        base_cycles = graph.process_cycles(
+            self._create_trace(base_prbs, mod, layers)
+        )
+        cycles = graph.process_cycles(trace)
+
+        pareto_front = []
+        for base_mapping in self._mappings[base_invariant]:
+            base_loads = self._processor_loads(base_mapping, base_cycles)
+            loads = self._processor_loads(base_mapping, cycles)
+
+            if loads.keys() != base_loads.keys():
+                return False
+            ratios = self._process_ratios(base_mapping, base_cycles, cycles)
+            if ratios is None:
+                return False
+            # bound the error by the spread of the scaling factors
+            error = max(ratios) / min(ratios) - 1.0
+            if error > self.pareto_interpolation_max_error:
+                log.debug(
+                    f"Cannot interpolate {invariant} from {base_invariant} "
+                    f"(error: {error:.3f})"
+                )
+                return False
+
+            time_factor = max(loads.values()) / max(base_loads.values())
+            energy_factor = sum(
+                loads[pe] * pe.dynamic_power() for pe in loads
+            ) / sum(base_loads[pe] * pe.dynamic_power() for pe in base_loads)
+
+            mapping = self._bind(base_mapping, graph)
+            # the time scale and offset only apply to the reported execution
+            # time, the static energy refers to the unscaled time
+            base_time = (
+                base_mapping.metadata.exec_time - self.pareto_time_offset
+            ) / self.pareto_time_scale
+            exec_time = base_time * time_factor
+            mapping.metadata.exec_time = (
+                exec_time * self.pareto_time_scale + self.pareto_time_offset
+            )
+            # FIXME: accessing private member
+            static_power = sum(
+                pe.static_power()
+                for pe in {
+                    info.affinity
+                    for info in base_mapping._process_info.values()
+                }
+            )
+            dynamic_energy = max(
+                base_mapping.metadata.energy - static_power * base_time, 0.0
+            )
+            mapping.metadata.energy = (
+                dynamic_energy * energy_factor + static_power * exec_time
+            )
+            pareto_front.append(mapping)
+
+        log.debug(f"Interpolated {invariant} from {base_invariant}")
+        # only keep the interpolated front in memory, it should never serve
+        # as a base for further interpolation
+        self._mappings[invariant] = pareto_front
+        return True
+
+    def _create_trace(self, prbs, mod, layers):
+        if self._proc_time is None:
+            self._proc_time = get_task_costs(
+                hydra.utils.to_absolute_path(self.cfg["task_file"]),
+                self.cfg["cost_model"],
+            )
+        ntrace = TraceFileManager.Trace(
+            PRBs=prbs, layers=layers, modulation_scheme=mod
+        )
+        return FivegTrace(ntrace, self._proc_time, self.cfg["antennas"])
+
+    @staticmethod
+    def _process_ratios(mapping, base_cycles, cycles):
+        """Compute the scaling factor of the execution time of each process.
+
+        Processes that do not execute under either cycle count are skipped.
+
+        Returns:
+            list of float: the scaling factors, or None if a process only
+                executes under one of the cycle counts
+        """
+        ratios = []
+        # FIXME: should not access private member directly
+        for name, info in mapping._process_info.items():
+            pe = info.affinity
+            base_ticks = pe.ticks(base_cycles[name].get(pe.type, 0))
+            ticks = pe.ticks(cycles[name].get(pe.type, 0))
+            if base_ticks > 0 and ticks > 0:
+                ratios.append(ticks / base_ticks)
+            elif base_ticks > 0 or ticks > 0:
+                return None
+        return ratios
+
+    @staticmethod
+    def _processor_loads(mapping, cycles):
+        """Compute the execution time of all processes mapped to each core.
+
+        Processors without any load are omitted.
+        """
+        loads = {}
+        # FIXME: should not access private member directly
+        for name, info in mapping._process_info.items():
+            pe = info.affinity
+            ticks = pe.ticks(cycles[name].get(pe.type, 0))
+            if ticks > 0:
+                loads[pe] = loads.get(pe, 0) + ticks
+        return loads
+
+    def preload(self):
+        """Load all Pareto fronts found in the disk cache into memory."""
+        if not self._cache_dir:
+            return
+        for file_name in os.listdir(self._cache_dir):
+            if file_name.endswith(".pickle"):
+                self._load(file_name[: -len(".pickle")])
+        log.info(f"Preloaded {len(self._cache)} Pareto fronts")
+
+    def _cache_file(self, invariant):
+        return os.path.join(self._cache_dir, f"{invariant}.pickle")
+
+    def _load(self, invariant):
+        """Load the Pareto front of an invariant from the disk cache."""
+        pareto_lists = pickle_load(self._cache_file(invariant))
+        if pareto_lists is not None:
+            log.debug(f"Loaded the Pareto front of {invariant} from disk")
+            self._cache[invariant] = pareto_lists
+
+    def _store(self, invariant):
+        """Store the Pareto front of an invariant in the disk cache."""
+        atomic_pickle_dump(self._cache[invariant], self._cache_file(invariant))
 
     def _to_lists(self, pareto_mappings):
         res = []
         for mapping in pareto_mappings:
-            res.append((mapping.to_list(), mapping.metadata))
+            res.append(
+                (
+                    mapping.to_list(),
+                    mapping.metadata.exec_time,
+                    mapping.metadata.energy,
+                )
+            )
         return res
 
     def _to_mappings(self, graph, pareto_lists):
         com_mapper = ComFullMapper(self.platform)
         mapper = ProcPartialMapper(graph, self.platform, com_mapper)
         res = []
-        for mapping_list, metadata in pareto_lists:
+        for mapping_list, exec_time, energy in pareto_lists:
             mapping = mapper.generate_mapping(mapping_list)
-            mapping.metadata.exec_time = metadata.exec_time
-            mapping.metadata.energy = metadata.energy
+            mapping.metadata.exec_time = exec_time
+            mapping.metadata.energy = energy
             res.append(mapping)
         return res
 
@@ -84,4 +390,79 @@ class FiveGParetoFrontCache:
                 + self.pareto_time_offset
             )
 
+        if self.pareto_epsilon is not None or self.pareto_max_points:
+            pareto_front = self._thin_pareto_front(pareto_front)
+
         return pareto_front
+
+    def _thin_pareto_front(self, pareto_front):
+        """Reduce the number of mappings in a Pareto front.
+
+        Returns:
+            list of Mapping: the remaining mappings sorted by execution time
+        """
+        front = sorted(
+            pareto_front,
+            key=lambda m: (m.metadata.exec_time, m.metadata.energy),
+        )
+
+        # epsilon-dominance filtering
+        if self.pareto_epsilon is not None:
+            factor = 1.0 + self.pareto_epsilon
+            thinned = []
+            for mapping in front:
+                time = mapping.metadata.exec_time
+                energy = mapping.metadata.energy
+                if not any(
+                    kept.metadata.exec_time <= factor * time
+                    and kept.metadata.energy <= factor * energy
+                    for kept in thinned
+                ):
+                    thinned.append(mapping)
+            # the most energy-efficient mapping may be epsilon-dominated by a
+            # faster one, but should remain available
+            efficient = min(
+                front, key=lambda m: (m.metadata.energy, m.metadata.exec_time)
+            )
+            if not any(m is efficient for m in thinned):
+                thinned.append(efficient)
+            front = thinned
+
+        if self.pareto_max_points and len(front) > self.pareto_max_points:
+            front = self._spread_pareto_front(front, self.pareto_max_points)
+
+        return front
+
+    @staticmethod
+    def _spread_pareto_front(front, num_points):
+        """Select mappings spread evenly along a sorted Pareto front.
+
+        The time and energy values are normalized to [0, 1]. Then, the
+        mappings closest to equidistant positions along the curve connecting
+        all mappings are selected. The first (fastest) and, if more than one
+        point is requested, the last mapping are always kept.
+        """
+        if num_points == 1:
+            return front[:1]
+
+        times = [m.metadata.exec_time for m in front]
+        energies = [m.metadata.energy for m in front]
+        time_range = (max(times) - min(times)) or 1.0
+        energy_range = (max(energies) - min(energies)) or 1.0
+
+        # the position of each mapping along the normalized curve
+        positions = [0.0]
+        for i in range(1, len(front)):
+            dt = (times[i] - times[i - 1]) / time_range
+            de = (energies[i] - energies[i - 1]) / energy_range
+            positions.append(positions[-1] + (dt * dt + de * de) ** 0.5)
+
+        selected = set()
+        for j in range(num_points):
+            target = positions[-1] * j / (num_points - 1)
+            candidates = [i for i in range(len(front)) if i not in selected]
+            selected.add(
+                min(candidates, key=lambda i: abs(positions[i] - target))
+            )
+
+        return [front[i] for i in sorted(selected)]
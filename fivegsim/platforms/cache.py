@@ -0,0 +1,72 @@
+# Copyright (C) 2021 TU Dresden
+# Licensed under the ISC license (see LICENSE.txt)
+#
+# Authors: Christian Menard
+
+import glob
+import logging
+import os
+import pickle
+
+import hydra
+
+from fivegsim.util.cache import (
+    atomic_pickle_dump,
+    config_hash,
+    package_version,
+    pickle_load,
+)
+
+log = logging.getLogger(__name__)
+
+
+def platform_cache_file(cfg, cache_dir):
+    """Get the path of the cached platform of a configuration.
+
+    The file name is derived from the resolved platform configuration and the
+    sources of the fivegsim platform modules, such that changes to the
+    platform classes invalidate the cache. Cached platforms are further
+    separated by the mocasin version, as the pickled platform depends on
+    mocasin's classes.
+    """
+    sources = sorted(glob.glob(os.path.join(os.path.dirname(__file__), "*.py")))
+    key = config_hash(cfg, keys=["platform"], files=sources)
+    return os.path.join(
+        cache_dir, f"mocasin-{package_version('mocasin')}", f"{key}.pickle"
+    )
+
+
+def instantiate_platform(cfg, cache_dir=None):
+    """Instantiate the platform of a configuration.
+
+    Constructing a platform involves instantiating all processors, building
+    the topology and generating the communication primitives. If
+    ``cache_dir`` is given, the constructed platform is pickled to this
+    directory and loaded from there by all subsequent calls with the same
+    platform configuration.
+
+    Args:
+        cfg (DictConfig): the hydra configuration object
+        cache_dir (str): the directory of the platform cache. The cache is not
+            used if None.
+
+    Returns:
+        Platform: the platform
+    """
+    if not cache_dir:
+        return hydra.utils.instantiate(cfg["platform"])
+
+    path = platform_cache_file(cfg, cache_dir)
+    platform = pickle_load(path)
+    if platform is not None:
+        log.info(f"Loaded the platform from {path}")
+        return platform
+
+    platform = hydra.utils.instantiate(cfg["platform"])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        atomic_pickle_dump(platform, path)
+        log.info(f"Stored the platform in {path}")
+    except (pickle.PicklingError, AttributeError, TypeError) as e:
+        log.warning(f"Could not store the platform in the cache: {e}")
+    return platform
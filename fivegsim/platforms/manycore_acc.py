@@ -0,0 +1,145 @@
+# Copyright (C) 2021 TU Dresden
+# Licensed under the ISC license (see LICENSE.txt)
+#
+# Authors: Christian Menard
+
+import copy
+
+from hydra.utils import instantiate
+
+from mocasin.common.platform import Platform, Processor
+from mocasin.platforms.platformDesigner import PlatformDesigner, cluster
+from mocasin.platforms.odroid import peParams
+
+
+def _instantiate_processor(processor):
+    # workaraound for Hydra < 1.1
+    if not isinstance(processor, Processor):
+        processor = instantiate(processor)
+    return processor
+
+
+class ManyCoreWithAccelerators(Platform):
+    """A scalable many-core platform with pooled accelerators.
+
+    The platform consists of ``num_clusters`` clusters of
+    ``cores_per_cluster`` general purpose cores. The clusters cycle through
+    the processor types given in ``cluster_processors``, e.g., two processor
+    types result in alternating little and big clusters. Each cluster has a
+    local L2 memory that is connected to the global DRAM.
+
+    The accelerators are grouped in one pool per kernel type. Each pool is a
+    separate cluster with a local scratchpad memory that is connected to the
+    global DRAM.
+
+    The topology is strictly hierarchical, such that each processor only
+    reaches its cluster memory and the DRAM. This keeps the number of paths
+    considered by the primitive generation linear in the number of
+    processors.
+
+    Args:
+        cluster_processors (list): the processors of the clusters
+        accelerators (dict): a dict mapping pool names to a dict with the
+            accelerator ``processor`` and the number ``num`` of accelerators
+            in the pool
+        num_clusters (int): the number of clusters of general purpose cores
+        cores_per_cluster (int): the number of cores in each cluster
+        l2_latency (int): the read and write latency of the cluster memories
+        l2_throughput (int): the read and write throughput of the cluster
+            memories
+        l2_frequency (int): the frequency of the cluster memories
+        dram_latency (int): the read and write latency of the DRAM
+        dram_throughput (int): the read and write throughput of the DRAM
+        dram_frequency (int): the frequency of the DRAM
+        acc_scheduling_cycles (int): the cycles an accelerator needs for
+            switching tasks
+        name (str): the platform name
+    """
+
+    def __init__(
+        self,
+        cluster_processors,
+        accelerators,
+        num_clusters=8,
+        cores_per_cluster=4,
+        l2_latency=21,
+        l2_throughput=8,
+        l2_frequency=1500000000,
+        dram_latency=120,
+        dram_throughput=8,
+        dram_frequency=933000000,
+        acc_scheduling_cycles=50,
+        name="manycore_acc",
+        **kwargs,
+    ):
+        cluster_processors = [
+            _instantiate_processor(p) for p in cluster_processors
+        ]
+        super().__init__(name, kwargs.get("symmetries_json", None))
+
+        # Start platform designer
+        designer = PlatformDesigner(self)
+        soc = cluster(name, designer)
+        soc.addStorage(
+            "DRAM",
+            readLatency=dram_latency,
+            writeLatency=dram_latency,
+            readThroughput=dram_throughput,
+            writeThroughput=dram_throughput,
+            frequency=dram_frequency,
+        )
+        dram = soc.findComRes("DRAM")
+
+        def add_cluster(cluster_name, memory_name, pes):
+            new_cluster = cluster(cluster_name, designer)
+            soc.addCluster(new_cluster)
+            for pe_name, processor in pes:
+                new_cluster.addPeToCluster(pe_name, *(peParams(processor)))
+            new_cluster.addStorage(
+                memory_name,
+                readLatency=l2_latency,
+                writeLatency=l2_latency,
+                readThroughput=l2_throughput,
+                writeThroughput=l2_throughput,
+                frequency=l2_frequency,
+            )
+            memory = new_cluster.findComRes(memory_name)
+            for pe in new_cluster.getProcessors():
+                designer.connectComponents(pe, memory)
+            designer.connectComponents(memory, dram)
+
+        # clusters of general purpose cores
+        for c in range(num_clusters):
+            processor = cluster_processors[c % len(cluster_processors)]
+            add_cluster(
+                f"cluster_{c:03d}",
+                f"L2_{c:03d}",
+                [
+                    (f"PE{c * cores_per_cluster + i:03d}", processor)
+                    for i in range(cores_per_cluster)
+                ],
+            )
+
+        # one accelerator pool per kernel type
+        for pool, acc in accelerators.items():
+            if acc["num"] == 0:
+                continue
+            processor = _instantiate_processor(acc["processor"])
+            add_cluster(
+                f"cluster_{pool}_acc",
+                f"SPM_{pool}",
+                [(f"{pool}_{i:02d}", processor) for i in range(acc["num"])],
+            )
+
+        # Reduce the scheduling cycles for the accelerators. The designer
+        # assigns each scheduler the same policy object, thus all accelerator
+        # schedulers share a single copy of the policy.
+        acc_policy = None
+        for scheduler in self.schedulers():
+            if scheduler.processors[0].type.startswith("acc:"):
+                if acc_policy is None:
+                    acc_policy = copy.deepcopy(scheduler.policy)
+                    acc_policy.scheduling_cycles = acc_scheduling_cycles
+                scheduler.policy = acc_policy
+
+        self.generate_all_primitives()
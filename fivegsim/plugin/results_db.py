@@ -0,0 +1,228 @@
+# Copyright (C) 2021 TU Dresden
+# Licensed under the ISC license (see LICENSE.txt)
+#
+# Authors: Christian Menard
+
+"""Collect the results of many simulations in a single SQLite database.
+
+Each simulation run with ``results_db`` set appends its summary, its
+configuration parameters and its per-application statistics to the
+database. The helpers in this module load the results into pandas data
+frames, such that post-processing does not need to walk the run directories
+of a multirun.
+
+Example::
+
+    from fivegsim.plugin.results_db import load_runs
+
+    df = load_runs("results.db", params=["platform.name", "load_balancer"])
+"""
+
+import json
+import os
+import sqlite3
+import time
+
+import pandas as pd
+from omegaconf import OmegaConf
+
+_schema = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    created REAL,
+    directory TEXT,
+    simulated_time REAL,
+    total_apps INTEGER,
+    total_rejected INTEGER,
+    missed_deadline INTEGER,
+    total_activations INTEGER,
+    average_scheduling_time REAL,
+    std_scheduling_time REAL,
+    summary TEXT
+);
+CREATE TABLE IF NOT EXISTS run_params (
+    run_id INTEGER REFERENCES runs(id),
+    key TEXT,
+    value TEXT
+);
+CREATE INDEX IF NOT EXISTS run_params_key_value ON run_params(key, value);
+CREATE INDEX IF NOT EXISTS run_params_run_id ON run_params(run_id);
+CREATE TABLE IF NOT EXISTS applications (
+    run_id INTEGER REFERENCES runs(id),
+    name TEXT,
+    prbs INTEGER,
+    mod INTEGER,
+    criticality INTEGER,
+    arrival INTEGER,
+    deadline INTEGER,
+    accepted INTEGER,
+    start_time INTEGER,
+    end_time INTEGER,
+    missed_deadline INTEGER
+);
+CREATE INDEX IF NOT EXISTS applications_run_id ON applications(run_id);
+"""
+
+_application_columns = [
+    "name",
+    "prbs",
+    "mod",
+    "criticality",
+    "arrival",
+    "deadline",
+    "accepted",
+    "start_time",
+    "end_time",
+    "missed_deadline",
+]
+
+
+def _connect(db_path):
+    # concurrent jobs of a multirun may write at the same time, wait for
+    # their transactions to finish instead of failing
+    connection = sqlite3.connect(db_path, timeout=60)
+    connection.executescript(_schema)
+    return connection
+
+
+def _flatten(container, prefix=""):
+    """Flatten a nested config container to a dict of dotted keys."""
+    flat = {}
+    for key, value in container.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, list):
+            flat[f"{prefix}{key}"] = json.dumps(value)
+        else:
+            flat[f"{prefix}{key}"] = str(value)
+    return flat
+
+
+def store_run(db_path, cfg, stats, simulated_time):
+    """Append the results of a simulation run to the database.
+
+    Args:
+        db_path (str): path to the SQLite database, created if needed
+        cfg (DictConfig): the configuration of the run
+        stats (FiveGManagerStatistics): the statistics of the run
+        simulated_time (float): the simulated time (in ms)
+    """
+    summary = stats.summary()
+    params = _flatten(OmegaConf.to_container(cfg, resolve=True))
+    connection = _connect(db_path)
+    try:
+        with connection:
+            cursor = connection.execute(
+                "INSERT INTO runs (created, directory, simulated_time, "
+                "total_apps, total_rejected, missed_deadline, "
+                "total_activations, average_scheduling_time, "
+                "std_scheduling_time, summary) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    time.time(),
+                    os.getcwd(),
+                    simulated_time,
+                    summary["Total_apps"],
+                    summary["Total_rejected"],
+                    summary["Missed_deadline"],
+                    summary["Total_activations"],
+                    summary["Average_scheduling_time"],
+                    summary["Std_scheduling_time"],
+                    json.dumps(summary),
+                ),
+            )
+            run_id = cursor.lastrowid
+            connection.executemany(
+                "INSERT INTO run_params (run_id, key, value) VALUES (?, ?, ?)",
+                [(run_id, key, value) for key, value in params.items()],
+            )
+            connection.executemany(
+                f"INSERT INTO applications (run_id, "
+                f"{', '.join(_application_columns)}) VALUES "
+                f"(?, {', '.join('?' * len(_application_columns))})",
+                [
+                    (run_id,)
+                    + tuple(getattr(app, c, None) for c in _application_columns)
+                    for app in stats.applications
+                ],
+            )
+    finally:
+        connection.close()
+    return run_id
+
+
+def query(db_path, sql, params=()):
+    """Run an SQL query on the database.
+
+    Returns:
+        pandas.DataFrame: the result of the query
+    """
+    connection = _connect(db_path)
+    try:
+        return pd.read_sql_query(sql, connection, params=params)
+    finally:
+        connection.close()
+
+
+def load_runs(db_path, params=(), where=None):
+    """Load the summaries of all runs together with selected parameters.
+
+    Args:
+        db_path (str): path to the SQLite database
+        params (list of str): the dotted config keys to add as columns
+        where (dict): only load runs whose parameters have the given values,
+            e.g., ``{"load_balancer": "True"}``. The values are compared as
+            strings.
+
+    Returns:
+        pandas.DataFrame: a data frame with one row per run
+    """
+    columns = ["r.*"]
+    joins = []
+    args = []
+    for i, key in enumerate(params):
+        name = key.replace('"', '""')
+        columns.append(f'p{i}.value AS "{name}"')
+        joins.append(
+            f"LEFT JOIN run_params p{i} ON p{i}.run_id = r.id AND p{i}.key = ?"
+        )
+        args.append(key)
+    for i, (key, value) in enumerate((where or {}).items()):
+        joins.append(
+            f"JOIN run_params w{i} ON w{i}.run_id = r.id "
+            f"AND w{i}.key = ? AND w{i}.value = ?"
+        )
+        args.extend([key, str(value)])
+    sql = f"SELECT {', '.join(columns)} FROM runs r {' '.join(joins)}"
+    return query(db_path, sql + " ORDER BY r.id", args)
+
+
+def load_applications(db_path, where=None):
+    """Load the per-application statistics of the selected runs.
+
+    Args:
+        db_path (str): path to the SQLite database
+        where (dict): only load applications of runs whose parameters have
+            the given values (see :func:`load_runs`)
+
+    Returns:
+        pandas.DataFrame: a data frame with one row per application
+    """
+    joins = []
+    args = []
+    for i, (key, value) in enumerate((where or {}).items()):
+        joins.append(
+            f"JOIN run_params w{i} ON w{i}.run_id = a.run_id "
+            f"AND w{i}.key = ? AND w{i}.value = ?"
+        )
+        args.extend([key, str(value)])
+    sql = f"SELECT a.* FROM applications a {' '.join(joins)}"
+    return query(db_path, sql + " ORDER BY a.run_id", args)
+
+
+def export_runs(db_path, csv_path, params=(), where=None):
+    """Export the summaries of the selected runs to a CSV file.
+
+    See :func:`load_runs` for the arguments.
+    """
+    load_runs(db_path, params, where).to_csv(csv_path, index=False)
@@ -6,6 +6,7 @@
 import copy
 import csv
 import logging
+import os
 import sys
 
 import hydra
@@ -21,12 +22,32 @@ from mocasin.simulate import scheduler
 from mocasin.tetris.manager import ResourceManager
 
 from fivegsim.graph import FivegGraph
+from fivegsim.platforms.cache import instantiate_platform
+from fivegsim.mapper.fiveg import FiveGMapper
+from fivegsim.plugin.results_db import store_run
+from fivegsim.simulate.admission import (
+    add_work,
+    estimate_completion,
+    processor_backlog,
+)
+from fivegsim.simulate.analytical import AnalyticalEstimator
 from fivegsim.simulate.application import FiveGRuntimeDataflowApplication
 from fivegsim.simulate.load_balancer import PhybenchLoadBalancer
+from fivegsim.simulate.priority import (
+    order_applications,
+    set_scheduler_policy,
+)
 from fivegsim.simulate.statistics import FiveGManagerStatistics
 from fivegsim.simulate.tetris import FiveGRuntimeTetrisManager
 from fivegsim.trace import FivegTrace
-from fivegsim.util.proc_tgff_reader import get_task_time
+from fivegsim.util.cache import (
+    atomic_pickle_dump,
+    config_hash,
+    package_sources,
+    package_version,
+    pickle_load,
+)
+from fivegsim.util.cost_model import get_task_costs
 from fivegsim.util.trace_file_manager import TraceFileManager
 
 sys.setrecursionlimit(10000)
@@ -65,29 +86,100 @@ class MergedFivegTrace(DataflowTrace):
 
 
 class FiveGSimulation(BaseSimulation):
-    """Simulate the processing of 5G data."""
-
-    def __init__(self, platform, cfg, trace_file, task_file, **kwargs):
+    """Simulate the processing of 5G data.
+
+    Args:
+        platform (Platform): the platform to simulate
+        cfg (DictConfig): the hydra configuration object
+        trace_file (str): path to the LTE trace
+        task_file (str): path to the task execution times
+        trace_file_manager (TraceFileManager): an already loaded trace, which
+            is used instead of ``trace_file``. The simulation consumes the
+            trace, thus it may not be shared with other simulations.
+        proc_time (dict): already loaded task execution times, which are used
+            instead of ``task_file``
+        pareto_cache (FiveGParetoFrontCache): a Pareto front cache for the
+            same platform, which is used by the TETRiS runtime instead of
+            creating a new cache
+    """
+
+    # config keys that do not influence the result of a simulation. All other
+    # keys, including those unknown to fivegsim, are part of the key of the
+    # result cache.
+    _uncached_keys = [
+        # names of output files, the statistics are cached in any case
+        "stats_applications",
+        "stats_activations",
+        # output locations
+        "result_cache_dir",
+        "results_db",
+        # the cache key covers the platform configuration and sources, thus a
+        # cached platform is identical to a constructed one
+        "platform_cache_dir",
+        # the cached fronts are identical to generated ones, unless they are
+        # used for interpolation (see _result_cache_file)
+        "pareto_cache_dir",
+        # settings of other tasks, which apply their overrides to the
+        # top-level keys before simulating
+        "validate_analytical",
+        "precompute_pareto",
+        "benchmark_platform",
+        "provision_accelerators",
+        "sweep",
+        "serve",
+    ]
+
+    def __init__(
+        self,
+        platform,
+        cfg,
+        trace_file,
+        task_file,
+        trace_file_manager=None,
+        proc_time=None,
+        pareto_cache=None,
+        **kwargs,
+    ):
         super().__init__(platform)
         self.cfg = cfg
         self.num_antennas = self.cfg["antennas"]
 
         # Get lte traces
-        self.TFM = TraceFileManager(hydra.utils.to_absolute_path(trace_file))
+        if trace_file_manager is None:
+            trace_file_manager = TraceFileManager(
+                hydra.utils.to_absolute_path(trace_file)
+            )
+        self.TFM = trace_file_manager
         self.ntrace = TraceFileManager.Trace()
 
         # Get task execution time info
-        self.proc_time = get_task_time(hydra.utils.to_absolute_path(task_file))
+        if proc_time is None:
+            proc_time = get_task_costs(
+                hydra.utils.to_absolute_path(task_file), self.cfg["cost_model"]
+            )
+        self.proc_time = proc_time
+
+        self.pareto_cache = pareto_cache
 
         # a list of application started during execution
         self.app_finished = []
 
+        # the running applications together with their process cycles and
+        # placement (only tracked if admission control is enabled)
+        self._running_applications = []
+
         # initialize simulation statistics
         self.stats = FiveGManagerStatistics()
 
+        # indicates whether the simulation stopped before the end of the trace
+        self.aborted = False
+
     @staticmethod
     def from_hydra(cfg, **kwargs):
-        platform = hydra.utils.instantiate(cfg["platform"])
+        cache_dir = cfg["platform_cache_dir"]
+        if cache_dir:
+            cache_dir = hydra.utils.to_absolute_path(cache_dir)
+        platform = instantiate_platform(cfg, cache_dir)
         return FiveGSimulation(platform, cfg, **kwargs)
 
     def _generate_graphs(self, sf_id, nsubframe):
@@ -131,6 +223,19 @@ class FiveGSimulation(BaseSimulation):
         return sf_graph, sf_trace
 
     def _generate_mappings(self, sf_name, graphs, traces):
+        # create a new mapper (this should be TETRiS in the future) Note
+        # that we need to create a new mapper here, as the GRAPH could change
+        # This appears to be a weakness of our mapper interface. The GRAPH
+        # should probably become a parameter of generate_mapping().
+        log.info(f"generate mapping for {sf_name}")
+        mapper = hydra.utils.instantiate(self.cfg["mapper"], self.platform)
+
+        # The FiveG mapper maps all applications of the subframe jointly
+        if isinstance(mapper, FiveGMapper):
+            mappings = mapper.generate_joint_mappings(graphs, traces)
+            log.info("mapping generation done")
+            return mappings
+
         # XXX Merge the applications and traces given above into one large
         # graph and trace for the entire subframe. This is just a workaround
         # for our mapper API that only accepts a single mapping
@@ -138,15 +243,9 @@ class FiveGSimulation(BaseSimulation):
             sf_name, graphs, traces
         )
 
-        # create a new mapper (this should be TETRiS in the future) Note
-        # that we need to create a new mapper here, as the GRAPH could change
-        # This appears to be a weakness of our mapper interface. The GRAPH
-        # should probably become a parameter of generate_mapping().
-        log.info(f"generate mapping for {sf_name}")
         rep = hydra.utils.instantiate(
             self.cfg["representation"], sf_graph, self.platform
         )
-        mapper = hydra.utils.instantiate(self.cfg["mapper"], self.platform)
         # create a mapping for the entire subframe
         sf_mapping = mapper.generate_mapping(
             sf_graph, trace=sf_trace, representation=rep
@@ -163,7 +262,9 @@ class FiveGSimulation(BaseSimulation):
             for sf_p in sf_mapping._process_info.keys():
                 if sf_p.startswith(graph.name):
                     p = sf_p[len(graph.name) + 1 :]
-                    mapping._process_info[p] = sf_mapping._process_info[sf_p]
+                    info = sf_mapping._process_info[sf_p]
+                    info.priority = graph.priority
+                    mapping._process_info[p] = info
             for sf_c in sf_mapping._channel_info.keys():
                 if sf_c.startswith(graph.name):
                     c = sf_c[len(graph.name) + 1 :]
@@ -173,6 +274,17 @@ class FiveGSimulation(BaseSimulation):
         return mappings
 
     def _start_applications(self, mappings, traces, nsubframe):
+        admission_control = self.cfg["admission_control"]
+        if admission_control:
+            self._running_applications = [
+                running
+                for running in self._running_applications
+                if not running[0].is_finished()
+            ]
+            backlog = processor_backlog(
+                self.platform.processors(), self._running_applications
+            )
+
         for mapping, trace in zip(mappings, traces):
             graph = mapping.graph
             # create a statistics entry for the application
@@ -183,6 +295,25 @@ class FiveGSimulation(BaseSimulation):
             # FIXME: There should be a way to set this when creating the entry
             # (or make true the default value)
             stats_entry.accepted = True
+
+            # reject the application if it is not expected to meet its
+            # deadline on top of the outstanding work
+            if admission_control:
+                cycles = graph.process_cycles(trace)
+                # FIXME: accessing private member
+                placement = {
+                    name: info.affinity
+                    for name, info in mapping._process_info.items()
+                }
+                completion = estimate_completion(
+                    self.env.now, backlog, cycles, placement
+                )
+                if completion > deadline:
+                    log.debug(f"Rejecting the application {graph.name}")
+                    stats_entry.accepted = False
+                    continue
+                add_work(backlog, cycles, placement)
+
             # instantiate the application
             app = FiveGRuntimeDataflowApplication(
                 name=graph.name,
@@ -192,6 +323,8 @@ class FiveGSimulation(BaseSimulation):
                 deadline=deadline,
                 stats_entry=stats_entry,
             )
+            if admission_control:
+                self._running_applications.append((app, cycles, placement))
             # start the application
             finished = self.env.process(app.run(mapping))
             # keep the finished event for later
@@ -227,13 +360,33 @@ class FiveGSimulation(BaseSimulation):
                 schedule_iteratively=self.cfg["tetris_iterative"],
             )
             runtime = FiveGRuntimeTetrisManager(
-                resource_manager, self.system, self.cfg, self.stats
+                resource_manager,
+                self.system,
+                self.cfg,
+                self.stats,
+                pareto_cache=self.pareto_cache,
             )
             finished = self.env.process(runtime.run())
             self.app_finished = [finished]
 
+        max_missed = self.cfg["max_missed_deadlines"]
+        hybrid = self.cfg["hybrid"]
+        if hybrid and runtime:
+            log.warning(
+                "The hybrid mode is not supported with a runtime, simulating "
+                "all subframes in detail"
+            )
+            hybrid = False
+        estimated_subframes = 0
+
         # while end of file not reached:
         while self.TFM.TF_EOF is not True:
+            # stop early once the simulation missed too many deadlines
+            if max_missed is not None and self._total_failed() > max_missed:
+                log.info(f"Stopping after {sf_count} subframes")
+                self.aborted = True
+                break
+
             # get next subframe
             nsubframe = self.TFM.get_next_subframe()
 
@@ -242,6 +395,12 @@ class FiveGSimulation(BaseSimulation):
             traces = self._generate_traces(nsubframe)
             sf_count += 1
 
+            # start the applications in the order of their priority
+            if self.cfg["priority_order"]:
+                order = order_applications(graphs, self.cfg["priority_order"])
+                graphs = [graphs[i] for i in order]
+                traces = [traces[i] for i in order]
+
             # just wait and try again if there is nothing to process
             if len(graphs) == 0:
                 # wait for 1 ms
@@ -251,6 +410,8 @@ class FiveGSimulation(BaseSimulation):
             if runtime:
                 # let the runtime handle the applications
                 runtime.start_applications(graphs, traces)
+            elif hybrid and self._estimate_subframe(graphs, traces):
+                estimated_subframes += 1
             else:
                 # if there is no runtime, we directly create mappings and start
                 # the applications
@@ -276,10 +437,70 @@ class FiveGSimulation(BaseSimulation):
         # wait until all applications finished
         yield self.env.all_of(self.app_finished)
 
+        if hybrid:
+            log.info(
+                f"Estimated {estimated_subframes} of {sf_count} subframes "
+                "analytically"
+            )
+        self._report()
+
+    def _estimate_subframe(self, graphs, traces):
+        """Estimate the applications of a lightly loaded subframe.
+
+        A subframe is only estimated if the platform is idle, no application
+        has criticality 1, all applications are expected to finish before the
+        next subframe starts and the expected utilization of the platform is
+        at most ``hybrid_max_utilization``. Thus, the platform is idle again
+        when the next subframe starts, and subsequent subframes can be
+        simulated in detail on top of it. Estimated applications are not
+        simulated and do not contribute to the energy consumption.
+
+        Returns:
+            bool: whether the subframe was estimated
+        """
+        now = self.env.now
+        if any(not finished.processed for finished in self.app_finished):
+            return False
+        if any(graph.criticality == 1 for graph in graphs):
+            return False
+
+        estimator = AnalyticalEstimator(self.platform)
+        next_subframe = now + 1000000000
+        completions = {}
+        for i in sorted(range(len(graphs)), key=lambda i: graphs[i].timeout):
+            completion, busy_until = estimator.predict(
+                graphs[i], traces[i], now
+            )
+            if completion > next_subframe:
+                return False
+            estimator.reserve(busy_until)
+            completions[i] = completion
+        utilization = estimator.utilization(now, next_subframe - now)
+        if utilization > self.cfg["hybrid_max_utilization"]:
+            return False
+
+        log.info(f"estimate applications of {len(graphs)} UEs analytically")
+        for i, graph in enumerate(graphs):
+            stats_entry = self.stats.new_application(
+                graph, arrival=now, deadline=now + graph.timeout
+            )
+            stats_entry.accepted = True
+            stats_entry.start_time = now
+            stats_entry.end_time = completions[i]
+            stats_entry.missed_deadline = 0
+        return True
+
+    def _report(self):
+        """Print the statistics and write them to files."""
         stats = self.stats
         print(f"Total applications: {stats.total_applications()}")
         print(f"Total rejected: {stats.total_rejected()}")
         print(f"Missed deadline: {stats.total_missed()}")
+        for cri, (missed, total) in stats.missed_by_criticality().items():
+            rate = f"{missed / total * 100:.2f} %" if total > 0 else "n/a"
+            print(
+                f"Missed deadline (criticality {cri}): {missed}/{total} ({rate})"
+            )
         print(f"Total runtime manager activations: {stats.total_activations()}")
         st_mean, st_std = stats.scheduling_time_stats()
         print(
@@ -290,6 +511,10 @@ class FiveGSimulation(BaseSimulation):
         stats.dump_applications(self.cfg["stats_applications"])
         self.to_file(stats)
 
+    def _total_failed(self):
+        """Count the applications that missed their deadline or were rejected."""
+        return self.stats.total_missed() + self.stats.total_rejected()
+
     def _run(self):
         """Run the simulation.
 
@@ -298,6 +523,40 @@ class FiveGSimulation(BaseSimulation):
         if self.result is not None:
             raise RuntimeError("A FiveGSimulation may only be run once!")
 
+        # reuse the result of an identical simulation if available
+        cache_file = self._result_cache_file()
+        cached = pickle_load(cache_file) if cache_file else None
+        if cached is not None:
+            log.info(f"Loaded the simulation result from {cache_file}")
+            self.result, self.stats, self.aborted = cached
+            self._report()
+        else:
+            if self.cfg["analytical"]:
+                self._estimate()
+            else:
+                self._simulate()
+            if cache_file:
+                os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+                cached = (self.result, self.stats, self.aborted)
+                atomic_pickle_dump(cached, cache_file)
+
+        # append the results to the results database
+        if self.cfg["results_db"]:
+            store_run(
+                hydra.utils.to_absolute_path(self.cfg["results_db"]),
+                self.cfg,
+                self.stats,
+                self.result.exec_time / 1000000000.0,
+            )
+
+    def _simulate(self):
+        """Simulate the processing of the trace and set the result."""
+        # select ready processes by application priority
+        if self.cfg["scheduler_policy"]:
+            # FIXME: should not access a private variable here
+            set_scheduler_policy(
+                self.system._schedulers, self.cfg["scheduler_policy"]
+            )
         # start all schedulers
         self.system.start_schedulers()
         # start the f process
@@ -317,16 +576,125 @@ class FiveGSimulation(BaseSimulation):
             self.result.static_energy = static_energy
             self.result.dynamic_energy = dynamic_energy
 
+    def _estimate(self):
+        """Estimate the processing of the trace analytically.
+
+        Instead of simulating the applications, their completion times are
+        estimated by :class:`AnalyticalEstimator`, which is orders of
+        magnitude faster. The applications are estimated in the order of
+        their deadlines and the estimate does not depend on the mapper or
+        the runtime. The statistics are recorded in the same order as in the
+        simulation. The result does not include the energy consumption.
+        """
+        if self.cfg["load_balancer"] or self.cfg["tetris_runtime"]:
+            log.warning("The analytical mode does not model the runtime")
+
+        estimator = AnalyticalEstimator(self.platform)
+        admission_control = self.cfg["admission_control"]
+        max_missed = self.cfg["max_missed_deadlines"]
+        now = 0
+        end = 0
+        sf_count = 0
+        while self.TFM.TF_EOF is not True:
+            # stop early once the simulation missed too many deadlines
+            if max_missed is not None and self._total_failed() > max_missed:
+                log.info(f"Stopping after {sf_count} subframes")
+                self.aborted = True
+                break
+
+            nsubframe = self.TFM.get_next_subframe()
+            graphs = self._generate_graphs(sf_count, nsubframe)
+            traces = self._generate_traces(nsubframe)
+            sf_count += 1
+
+            # start the applications in the order of their priority
+            if self.cfg["priority_order"]:
+                order = order_applications(graphs, self.cfg["priority_order"])
+                graphs = [graphs[i] for i in order]
+                traces = [traces[i] for i in order]
+
+            # record the applications in the order in which the simulation
+            # starts them, but estimate them in the order of their deadlines
+            stats_entries = [
+                self.stats.new_application(
+                    graph, arrival=now, deadline=now + graph.timeout
+                )
+                for graph in graphs
+            ]
+            order = sorted(range(len(graphs)), key=lambda i: graphs[i].timeout)
+            for i in order:
+                graph = graphs[i]
+                deadline = now + graph.timeout
+                stats_entry = stats_entries[i]
+                completion, busy_until = estimator.predict(
+                    graph, traces[i], now
+                )
+                if admission_control and completion > deadline:
+                    log.debug(f"Rejecting the application {graph.name}")
+                    stats_entry.accepted = False
+                    continue
+                stats_entry.accepted = True
+                # applications are killed once they reach their deadline
+                estimator.reserve(busy_until, until=deadline)
+                stats_entry.start_time = now
+                stats_entry.end_time = min(completion, deadline)
+                stats_entry.missed_deadline = int(completion > deadline)
+                end = max(end, stats_entry.end_time)
+
+            # advance by 1 ms
+            now += 1000000000
+
+        self.result = SimulationResult(
+            exec_time=max(now, end), static_energy=None, dynamic_energy=None
+        )
+        self._report()
+
+    def _result_cache_file(self):
+        """Get the file caching the result of this simulation.
+
+        The file name is derived from the resolved configuration, the
+        contents of the trace and task files and the sources of fivegsim.
+        Cached results are further separated by the versions of fivegsim and
+        mocasin.
+
+        Results are not cached if TETRiS interpolates Pareto fronts from the
+        fronts in ``pareto_cache_dir``, as the result then depends on the
+        contents of this directory.
+
+        Returns:
+            str: the path of the file or None if the cache is disabled
+        """
+        cache_dir = self.cfg["result_cache_dir"]
+        if not cache_dir:
+            return None
+        if (
+            self.cfg["tetris_runtime"]
+            and self.cfg["pareto_prb_interpolation"]
+            and self.cfg["pareto_cache_dir"]
+        ):
+            log.info(
+                "Not caching the result, as it depends on the Pareto fronts "
+                "in pareto_cache_dir"
+            )
+            return None
+        keys = [k for k in self.cfg.keys() if k not in self._uncached_keys]
+        files = [
+            hydra.utils.to_absolute_path(self.cfg["trace_file"]),
+            hydra.utils.to_absolute_path(self.cfg["task_file"]),
+        ] + package_sources()
+        digest = config_hash(self.cfg, keys, files=files)
+        versions = (
+            f"fivegsim-{package_version('fivegsim')}_"
+            f"mocasin-{package_version('mocasin')}"
+        )
+        return os.path.join(
+            hydra.utils.to_absolute_path(cache_dir),
+            versions,
+            f"{digest}.pickle",
+        )
+
     def to_file(self, stats):
-        stats_dict = {}
-        stats_dict["Total_apps"] = str(stats.total_applications())
-        stats_dict["Total_rejected"] = str(stats.total_rejected())
-        stats_dict["Missed_deadline"] = str(stats.total_missed())
-        stats_dict["Total_activations"] = str(stats.total_activations())
-        stats_dict["Total_scheduling_time"] = str(stats.total_scheduling_time())
-        st_mean, st_std = stats.scheduling_time_stats()
-        stats_dict["Average_scheduling_time"] = str(st_mean)
-        stats_dict["Std_scheduling_time"] = str(st_std)
+        stats_dict = {k: str(v) for k, v in stats.summary().items()}
         with open("missrate.csv", "x") as file:
             writer = csv.writer(
                 file,
@@ -0,0 +1,78 @@
+# Copyright (C) 2021 TU Dresden
+# Licensed under the ISC license (see LICENSE.txt)
+#
+# Authors: Christian Menard
+
+
+def processor_backlog(processors, applications):
+    """Estimate the outstanding work of each processor (in ticks).
+
+    The estimate sums up the execution time of all processes that are mapped
+    to a processor and did not finish yet. The progress of partially executed
+    processes is not taken into account.
+
+    Args:
+        processors (list of Processor): the processors to consider
+        applications (iterable): tuples of a running application, the cycles
+            of its processes (as returned by :meth:`FivegGraph.process_cycles`)
+            and its initial placement (a dict mapping process names to
+            processors)
+
+    Returns:
+        dict: a dict mapping each processor to its backlog
+    """
+    backlog = dict.fromkeys(processors, 0)
+    for app, cycles, initial_placement in applications:
+        if app.is_finished():
+            continue
+        # the process mappings are only set once the application runs,
+        # before that we fall back to the initial placement
+        # FIXME: should not access private member directly
+        if app._process_mappings:
+            placement = {
+                p.name: pe
+                for p, pe in app._process_mappings.items()
+                if not p.finished.triggered
+            }
+        else:
+            placement = initial_placement
+        for process_name, pe in placement.items():
+            backlog[pe] += pe.ticks(cycles[process_name].get(pe.type, 0))
+    return backlog
+
+
+def estimate_completion(now, backlog, cycles, placement):
+    """Estimate the completion time of a new application.
+
+    The application is assumed to finish once all processors it is placed on
+    processed their backlog and the work of the application. Dependencies
+    between the processes are not taken into account.
+
+    Args:
+        now (int): the current simulation time
+        backlog (dict): the backlog of each processor (in ticks)
+        cycles (dict): the cycles of the processes of the application
+        placement (dict): a dict mapping process names to processors
+
+    Returns:
+        int: the estimated absolute completion time (in ticks)
+    """
+    load = {}
+    add_work(load, cycles, placement)
+    return now + max(
+        (backlog.get(pe, 0) + ticks for pe, ticks in load.items()), default=0
+    )
+
+
+def add_work(backlog, cycles, placement):
+    """Add the work of an application to the backlog of the processors.
+
+    Args:
+        backlog (dict): the backlog of each processor (in ticks), which is
+            updated in place
+        cycles (dict): the cycles of the processes of the application
+        placement (dict): a dict mapping process names to processors
+    """
+    for process_name, pe in placement.items():
+        ticks = pe.ticks(cycles[process_name].get(pe.type, 0))
+        backlog[pe] = backlog.get(pe, 0) + ticks
@@ -0,0 +1,109 @@
+# Copyright (C) 2021 TU Dresden
+# Licensed under the ISC license (see LICENSE.txt)
+#
+# Authors: Christian Menard
+
+
+class AnalyticalEstimator:
+    """Estimate the completion of applications without event simulation.
+
+    The estimator list-schedules the processes of an application phase by
+    phase. All instances of a phase become ready once the previous phase
+    finished, as the phases are fully interconnected. The subkernels of an
+    instance execute one after another, each on the processor (core or
+    accelerator) where it finishes first. Each processor executes its tasks
+    in order without preemption, thus its state reduces to the time it is
+    busy until. This backlog is carried over between applications and
+    subframes, which approximates the queueing of work on the processors.
+    Communication costs are not taken into account.
+
+    Args:
+        platform (Platform): the platform to estimate the execution on
+    """
+
+    def __init__(self, platform):
+        self.processors = list(platform.processors())
+        # the time until which each processor is busy (in ticks)
+        self.busy_until = dict.fromkeys(self.processors, 0)
+        # the context switch overhead of each processor (in cycles)
+        self._overhead = dict.fromkeys(self.processors, 0)
+        for scheduler in platform.schedulers():
+            for pe in scheduler.processors:
+                self._overhead[pe] = scheduler.policy.scheduling_cycles
+
+    def _subkernel_ticks(self, trace, subkernel):
+        """Get the execution time of a subkernel on each capable processor."""
+        cycles = trace.accumulate_processor_cycles(f"{subkernel}0")
+        return {
+            pe: pe.ticks(cycles[pe.type] + self._overhead[pe])
+            for pe in self.processors
+            if pe.type in cycles
+        }
+
+    def predict(self, graph, trace, now):
+        """Predict the completion of an application started at ``now``.
+
+        The prediction does not change the state of the estimator.
+
+        Args:
+            graph (FivegGraph): the graph of the application
+            trace (FivegTrace): the trace of the application
+            now (int): the start time of the application (in ticks)
+
+        Returns:
+            tuple: the completion time of the application and the updated
+                busy times of the processors (see :meth:`reserve`)
+        """
+        busy_until = dict(self.busy_until)
+        ready = now
+        for phase in graph.structure.values():
+            subkernel_ticks = [
+                self._subkernel_ticks(trace, subkernel)
+                for subkernel in phase["subkernels"]
+            ]
+            phase_end = ready
+            for _ in range(phase["num_instances"]):
+                time = ready
+                for ticks in subkernel_ticks:
+                    # ties are broken by the order of the processors
+                    pe = min(
+                        ticks, key=lambda p: max(time, busy_until[p]) + ticks[p]
+                    )
+                    time = max(time, busy_until[pe]) + ticks[pe]
+                    busy_until[pe] = time
+                phase_end = max(phase_end, time)
+            ready = phase_end
+        return ready, busy_until
+
+    def reserve(self, busy_until, until=None):
+        """Commit the busy times of a prediction.
+
+        Args:
+            busy_until (dict): the busy times returned by :meth:`predict`
+            until (int): the time the application is stopped at, e.g., its
+                deadline. Work scheduled after this time is dropped.
+        """
+        for pe, time in busy_until.items():
+            if until is not None:
+                time = max(self.busy_until[pe], min(time, until))
+            self.busy_until[pe] = time
+
+    def utilization(self, now, horizon):
+        """Get the fraction of the processor time that is reserved.
+
+        Idle gaps between reserved tasks count as reserved, thus the
+        utilization is overestimated.
+
+        Args:
+            now (int): the start of the considered time frame (in ticks)
+            horizon (int): the length of the considered time frame (in ticks)
+
+        Returns:
+            float: the reserved fraction of all processors between ``now``
+                and ``now + horizon``
+        """
+        reserved = sum(
+            min(max(time - now, 0), horizon)
+            for time in self.busy_until.values()
+        )
+        return reserved / (horizon * len(self.processors))
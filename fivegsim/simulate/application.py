@@ -36,6 +36,7 @@ class FiveGRuntimeDataflowApplication(RuntimeDataflowApplication):
         self.criticality = graph.criticality
         self.prbs = graph.prbs
         self.mod = graph.mod
+        self.priority = graph.priority
         self.deadline = deadline
         self.stats_entry = stats_entry
 
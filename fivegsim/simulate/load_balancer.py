@@ -12,25 +12,127 @@ from mocasin.common.mapping import (
     ProcessMappingInfo,
 )
 from mocasin.simulate.manager import RuntimeManager
+from mocasin.simulate.process import ProcessState
 
 from fivegsim.simulate import FiveGRuntimeDataflowApplication
+from fivegsim.simulate.admission import (
+    add_work,
+    estimate_completion,
+    processor_backlog,
+)
 
 log = logging.getLogger(__name__)
 
 
+def _graph_chains(graph):
+    """Get the phase instance chains of a FiveG graph.
+
+    Returns:
+        dict: a dict mapping each process name to the names of the processes
+            following it within the same phase instance
+    """
+    chains = {}
+    for phase in graph.structure.values():
+        subkernels = phase["subkernels"]
+        for i in range(phase["num_instances"]):
+            names = [f"{subkernel}{i}" for subkernel in subkernels]
+            for k, name in enumerate(names):
+                chains[name] = names[k + 1 :]
+    return chains
+
+
 class PhybenchLoadBalancer(RuntimeManager):
+    """A work stealing runtime for the PHY benchmark.
+
+    New applications are placed on the general purpose cores of the platform
+    and idle schedulers steal ready processes from busy schedulers. The
+    initial placement is controlled by the ``load_balancer_placement`` config
+    key:
+
+    - ``round_robin``: all processes of an application are mapped to a single
+      core, the cores are selected in a round robin fashion.
+    - ``least_loaded``: the phase instances of an application are spread
+      across the cores, each instance is mapped to the core with the least
+      outstanding work.
+
+    If ``load_balancer_acc_affinity`` is set, kernels supported by an
+    accelerator are mapped directly to the accelerator pool at launch, unless
+    the pool is oversubscribed.
+
+    The ``load_balancer_steal`` config key controls what is migrated when an
+    idle core steals work:
+
+    - ``process``: only the ready process is migrated.
+    - ``chain``: the ready process is migrated together with all following
+      processes of its phase instance (e.g. mf -> ifftm -> wind -> fft) that
+      did not start yet and reside on the same core. This keeps the
+      intermediate channels local. Accelerators always steal single processes.
+    """
+
     def __init__(self, system, cfg, stats):
         super().__init__(system, stats)
         self.cfg = cfg
 
         platform = system.platform
 
+        self._placement_mode = cfg["load_balancer_placement"]
+        if self._placement_mode not in ("round_robin", "least_loaded"):
+            raise ValueError(
+                f"Unknown load balancer placement: {self._placement_mode}"
+            )
+
+        self._acc_affinity = cfg["load_balancer_acc_affinity"]
+
+        self._steal_mode = cfg["load_balancer_steal"]
+        if self._steal_mode not in ("process", "chain"):
+            raise ValueError(f"Unknown load balancer steal: {self._steal_mode}")
+
+        # the phase instance chains of the running applications
+        self._chains = {}
+
+        # reject applications that are not expected to meet their deadline
+        self._admission_control = cfg["admission_control"]
+
+        # only keep track of the load if the placement or admission depends on
+        # it
+        self._track_load = (
+            self._placement_mode == "least_loaded"
+            or self._acc_affinity
+            or self._admission_control
+        )
+
         # keep track of all running applications
         self._running_applications = {}
 
-        # an indicating that the runtime should wake
+        # the processor cycles of all processes of the running applications
+        self._process_cycles = {}
+
+        # the initial placement of all processes of the running applications
+        self._placements = {}
+
+        # all general purpose cores of the platform
+        self._cores = [
+            pe for pe in platform.processors() if not pe.type.startswith("acc")
+        ]
+
+        # a dict mapping kernel names to the accelerators supporting them
+        self._accelerator_pools = {}
+        for pe in platform.processors():
+            if pe.type.startswith("acc:"):
+                for kernel in pe.type[4:].split(","):
+                    self._accelerator_pools.setdefault(kernel, []).append(pe)
+
+        # cache the best primitive for each pair of processors
+        self._primitives = {}
+
+        # an event indicating that the runtime should wake up. All
+        # notifications that arrive before the runtime process woke up are
+        # coalesced into a single wake-up.
         self._wake_up = self.env.event()
 
+        # the process_ready events of busy schedulers that we are waiting for
+        self._ready_waits = {}
+
         # a list to keep track of all events indicating when an app finished
         self._finished_events = []
 
@@ -54,7 +156,9 @@ class PhybenchLoadBalancer(RuntimeManager):
         self._log.info("Starting up")
 
         while True:
-            yield self.env.any_of([self._wake_up, self._request_shutdown])
+            yield self._wake_up
+            # any notification from now on triggers another iteration
+            self._wake_up = self.env.event()
 
             # break out of loop if shutdown was requested
             if self._request_shutdown.triggered:
@@ -81,6 +185,12 @@ class PhybenchLoadBalancer(RuntimeManager):
         for name, app in list(self._running_applications.items()):
             if app.is_finished():
                 self._running_applications.pop(name)
+                self._process_cycles.pop(name, None)
+                self._placements.pop(name, None)
+                self._chains.pop(name, None)
+
+        if self._track_load:
+            backlog = self._processor_backlog()
 
         # Create random mappings for all the applications
         for graph, trace in zip(graphs, traces):
@@ -92,14 +202,43 @@ class PhybenchLoadBalancer(RuntimeManager):
             # FIXME: There should be a way to set this when creating the entry
             # (or make true the default value)
             stats_entry.accepted = True
-            processor = next(self._processor_iterator)
-            # don't map on accelerators
-            while processor.type.startswith("acc"):
-                processor = next(self._processor_iterator)
             # create the mapping
-            mapping = self._generate_single_core_mapping(
-                graph, trace, processor
-            )
+            if self._track_load:
+                cycles = graph.process_cycles(trace)
+                self._process_cycles[graph.name] = cycles
+            if self._admission_control:
+                initial_backlog = dict(backlog)
+            if self._placement_mode == "least_loaded":
+                placement = self._least_loaded_placement(graph, cycles, backlog)
+                if self._acc_affinity:
+                    self._assign_accelerators(graph, placement, backlog)
+                mapping = self._generate_mapping(graph, placement)
+            else:
+                processor = next(self._processor_iterator)
+                # don't map on accelerators
+                while processor.type.startswith("acc"):
+                    processor = next(self._processor_iterator)
+                mapping = self._generate_single_core_mapping(
+                    graph,
+                    trace,
+                    processor,
+                    backlog=backlog if self._track_load else None,
+                )
+
+            if self._admission_control:
+                placement = self._placements[graph.name]
+                completion = estimate_completion(
+                    self.env.now, initial_backlog, cycles, placement
+                )
+                if completion > deadline:
+                    self._log.debug(f"Rejecting the application {graph.name}")
+                    stats_entry.accepted = False
+                    self._process_cycles.pop(graph.name)
+                    self._placements.pop(graph.name)
+                    backlog = initial_backlog
+                    continue
+                add_work(initial_backlog, cycles, placement)
+                backlog = initial_backlog
 
             app = FiveGRuntimeDataflowApplication(
                 name=graph.name,
@@ -112,34 +251,157 @@ class PhybenchLoadBalancer(RuntimeManager):
 
             self._log.debug(f"Launching the application {app.name}")
             self._running_applications[app.name] = app
+            if self._steal_mode == "chain":
+                self._chains[app.name] = _graph_chains(graph)
             finished = self.env.process(app.run(mapping))
             self._finished_events.append(finished)
 
-        # notify the event
-        self._wake_up.succeed()
-        self._wake_up = self.env.event()
+        self._notify()
+
+    def shutdown(self):
+        super().shutdown()
+        # wake up the runtime process, such that it notices the request
+        self._notify()
+
+    def _notify(self):
+        """Notify the runtime process that there might be work to steal."""
+        if not self._wake_up.triggered:
+            self._wake_up.succeed()
 
-    def _generate_single_core_mapping(self, graph, trace, processor):
+    def _generate_single_core_mapping(
+        self, graph, trace, processor, backlog=None
+    ):
         self._log.debug(f"Mapping {graph.name} to processor {processor.name}")
+        placement = {p.name: processor for p in graph.processes()}
+
+        if self._acc_affinity:
+            # account for the work added to the processor
+            cycles = self._process_cycles[graph.name]
+            for name in placement:
+                backlog[processor] += processor.ticks(
+                    cycles[name].get(processor.type, 0)
+                )
+            self._assign_accelerators(graph, placement, backlog)
+
+        return self._generate_mapping(graph, placement)
 
+    def _generate_mapping(self, graph, placement):
+        """Create a mapping from a dict of process names to processors."""
         platform = self.system.platform
-        scheduler = platform.find_scheduler_for_processor(processor)
 
         mapping = Mapping(graph, platform)
 
         for p in graph.processes():
-            process_mapping_info = ProcessMappingInfo(scheduler, processor)
+            processor = placement[p.name]
+            scheduler = platform.find_scheduler_for_processor(processor)
+            process_mapping_info = ProcessMappingInfo(
+                scheduler, processor, graph.priority
+            )
             mapping.add_process_info(p, process_mapping_info)
 
-        primitive = self._find_best_primitive(processor, processor)
-
         for c in graph.channels():
+            # the graph only contains channels with a single sink
+            src_processor = placement[c.source.name]
+            sink_processor = placement[c.sinks[0].name]
+            primitive = self._find_best_primitive(src_processor, sink_processor)
             channel_info = ChannelMappingInfo(primitive, 16)
             mapping.add_channel_info(c, channel_info)
 
+        # remember the placement for estimating the backlog
+        if self._track_load:
+            self._placements[graph.name] = placement
+
         return mapping
 
+    def _least_loaded_placement(self, graph, cycles, backlog):
+        """Spread the phase instances of a graph across the cores.
+
+        The instances are placed one after another, each on the core that
+        finishes it first given the current backlog. Subkernels of the same
+        instance are kept on the same core. Cores without cost information
+        for the instance are not considered, unless no core has cost
+        information. The backlog is updated in place, such that the placement
+        of subsequent applications accounts for the work added here.
+        """
+        placement = {}
+        for phase in graph.structure.values():
+            subkernels = phase["subkernels"]
+            for i in range(phase["num_instances"]):
+                names = [f"{subkernel}{i}" for subkernel in subkernels]
+                cores = [
+                    pe
+                    for pe in self._cores
+                    if all(pe.type in cycles[name] for name in names)
+                ] or self._cores
+                instance_ticks = {
+                    pe: sum(
+                        pe.ticks(cycles[name].get(pe.type, 0)) for name in names
+                    )
+                    for pe in cores
+                }
+                pe = min(
+                    cores,
+                    key=lambda pe: backlog[pe] + instance_ticks[pe],
+                )
+                backlog[pe] += instance_ticks[pe]
+                for name in names:
+                    placement[name] = pe
+        self._log.debug(
+            f"Spread {graph.name} across "
+            f"{len(set(placement.values()))} processors"
+        )
+        return placement
+
+    def _assign_accelerators(self, graph, placement, backlog):
+        """Move processes supported by an accelerator to the accelerator.
+
+        Each process of a kernel supported by an accelerator pool is moved to
+        the accelerator of the pool that finishes it first. The process stays
+        on its core if the pool is oversubscribed, i.e., if the accelerator
+        would finish the process later than the core. Such processes may still
+        be stolen by the accelerators later on. The placement and the backlog
+        are updated in place.
+        """
+        cycles = self._process_cycles[graph.name]
+        for phase in graph.structure.values():
+            for subkernel in phase["subkernels"]:
+                pool = self._accelerator_pools.get(subkernel)
+                if not pool:
+                    continue
+                for i in range(phase["num_instances"]):
+                    name = f"{subkernel}{i}"
+                    core = placement[name]
+                    # skip kernels without cost information for the pool
+                    if pool[0].type not in cycles[name]:
+                        continue
+                    acc_ticks = {
+                        pe: pe.ticks(cycles[name].get(pe.type, 0))
+                        for pe in pool
+                    }
+                    acc = min(pool, key=lambda pe: backlog[pe] + acc_ticks[pe])
+                    if backlog[acc] + acc_ticks[acc] > backlog[core]:
+                        self._log.debug(
+                            f"Accelerators for {subkernel} are oversubscribed"
+                        )
+                        continue
+                    backlog[core] -= core.ticks(cycles[name].get(core.type, 0))
+                    backlog[acc] += acc_ticks[acc]
+                    placement[name] = acc
+
+    def _processor_backlog(self):
+        """Estimate the outstanding work of each processor (in ticks)."""
+        return processor_backlog(
+            self.system.platform.processors(),
+            (
+                (app, self._process_cycles[name], self._placements[name])
+                for name, app in self._running_applications.items()
+            ),
+        )
+
     def _find_best_primitive(self, src, sink):
+        if (src, sink) in self._primitives:
+            return self._primitives[(src, sink)]
+
         # find all suitable_primitives
         suitable_primitives = []
         for primitive in self.system.platform.primitives():
@@ -148,6 +410,7 @@ class PhybenchLoadBalancer(RuntimeManager):
 
         # return the best one
         suitable_primitives.sort(key=lambda p: p.static_costs(src, sink))
+        self._primitives[(src, sink)] = suitable_primitives[0]
         return suitable_primitives[0]
 
     def _scheduler_idle_callback(self, event):
@@ -161,8 +424,97 @@ class PhybenchLoadBalancer(RuntimeManager):
     def _scheduler_ready_callback(self, _):
         self._log.debug("A scheduler has new ready processes")
         # wake up
-        self._wake_up.succeed()
-        self._wake_up = self.env.event()
+        self._notify()
+
+    def _wait_for_ready(self, scheduler):
+        """Wake up the runtime once a busy scheduler has new ready processes.
+
+        Only a single callback is registered per process_ready event, no
+        matter how many steal attempts failed in the meantime.
+        """
+        event = scheduler.process_ready
+        if self._ready_waits.get(scheduler) is event:
+            return
+        self._ready_waits[scheduler] = event
+        if event.processed:
+            self._notify()
+        else:
+            event.callbacks.append(self._scheduler_ready_callback)
+
+    def _movable_successors(self, process, scheduler):
+        """Get the following processes in the phase instance of a process.
+
+        The chain is cut at the first process that is not mapped to the given
+        scheduler or that is neither ready nor created. Like the stolen
+        process itself, only processes that do not execute or wait for
+        tokens are migrated with :meth:`System.move_process`. Blocked,
+        running and finished processes stay where they are.
+        """
+        app = process.app
+        names = self._chains[app.name][process.name]
+        # FIXME: should not access private member directly
+        processor = scheduler._processor
+
+        successors = []
+        current = process
+        for name in names:
+            # follow the outgoing channel to the next process in the chain
+            # FIXME: should not access private member directly
+            successor = None
+            for channel_ref in current._channels.values():
+                channel = channel_ref()
+                if channel._src() is not current:
+                    continue
+                sink_process = channel._sinks[0]()
+                if sink_process.name == name:
+                    successor = sink_process
+                    break
+            if (
+                successor is None
+                or app._process_mappings[successor] is not processor
+                or not (
+                    successor.check_state(ProcessState.READY)
+                    or successor.check_state(ProcessState.CREATED)
+                )
+            ):
+                break
+            successors.append(successor)
+            current = successor
+
+        return successors
+
+    def _migrate(self, processes, from_scheduler, to_scheduler):
+        """Move processes to another scheduler and update their channels."""
+        # FIXME: should not access private member directly
+        from_processor = from_scheduler._processor
+        to_processor = to_scheduler._processor
+
+        # move the tasks
+        channels = {}
+        for process in processes:
+            self.system.move_process(process, from_processor, to_processor)
+            process.app._process_mappings[process] = to_processor
+            # FIXME: should not access private member directly
+            for channel_ref in process._channels.values():
+                channel = channel_ref()
+                channels[id(channel)] = (channel, process.app)
+
+        # and update their primitives. Channels between processes of the
+        # migrated group are only updated once.
+        # FIXME: should not access private member directly
+        for channel, app in channels.values():
+            # the algorithm only works for channels with a single sink
+            assert len(channel._sinks) == 1
+
+            src_process = channel._src()
+            sink_process = channel._sinks[0]()
+
+            src_processor = app._process_mappings[src_process]
+            sink_processor = app._process_mappings[sink_process]
+
+            channel._primitive = self._find_best_primitive(
+                src_processor, sink_processor
+            )
 
     def _steal_task(self, scheduler):
         busy_schedulers = [s for s in self._schedulers if not s.is_idle]
@@ -176,7 +528,7 @@ class PhybenchLoadBalancer(RuntimeManager):
             acc_tasks = processor_type[4:].split(",")
 
         found_task_to_steal = False
-        ready_events = []
+        waiting_schedulers = []
         # iterate over all busy schedulers
         for busy_scheduler in busy_schedulers:
             # check if the scheduler has ready tasks
@@ -194,46 +546,24 @@ class PhybenchLoadBalancer(RuntimeManager):
                 else:
                     process = busy_scheduler._ready_queue[0]
             if process:
+                found_task_to_steal = True
+                processes = [process]
+                if self._steal_mode == "chain" and not is_acc:
+                    processes.extend(
+                        self._movable_successors(process, busy_scheduler)
+                    )
                 self._log.debug(
-                    f"{scheduler.name} steals {process.name} from "
+                    f"{scheduler.name} steals "
+                    f"{', '.join(p.name for p in processes)} from "
                     f"{busy_scheduler.name}"
                 )
-                found_task_to_steal = True
-
-                app = process.app
-
-                # move the task
-                # FIXME: should not access private member directly
-                from_processor = busy_scheduler._processor
-                to_processor = scheduler._processor
-                self.system.move_process(process, from_processor, to_processor)
-                app._process_mappings[process] = to_processor
-
-                # and update its primitives
-                # FIXME: should not access private member directly
-                for channel_ref in process._channels.values():
-                    channel = channel_ref()
-                    # the algorithm only works for channels with a single sink
-                    assert len(channel._sinks) == 1
-
-                    src_process = channel._src()
-                    sink_process = channel._sinks[0]()
-
-                    src_processor = app._process_mappings[src_process]
-                    sink_processor = app._process_mappings[sink_process]
-
-                    channel._primitive = self._find_best_primitive(
-                        src_processor, sink_processor
-                    )
-
+                self._migrate(processes, busy_scheduler, scheduler)
             else:
-                ready_events.append(busy_scheduler.process_ready)
+                waiting_schedulers.append(busy_scheduler)
 
         if not found_task_to_steal:
             self._log.debug(
                 f"Did not find a task to steal for {scheduler.name}"
             )
-            if len(ready_events) > 0:
-                self.env.any_of(ready_events).callbacks.append(
-                    self._scheduler_ready_callback
-                )
+            for busy_scheduler in waiting_schedulers:
+                self._wait_for_ready(busy_scheduler)
@@ -0,0 +1,133 @@
+# Copyright (C) 2021 TU Dresden
+# Licensed under the ISC license (see LICENSE.txt)
+#
+# Authors: Christian Menard
+
+import math
+
+from mocasin.simulate.scheduler import FifoScheduler
+
+
+def _criticality_key(graph):
+    # higher priorities first
+    return -graph.priority
+
+
+def _deadline_key(graph):
+    # earliest deadline first, all applications of a subframe arrive at the
+    # same time
+    return graph.timeout
+
+
+_orders = {
+    "criticality": _criticality_key,
+    "deadline": _deadline_key,
+}
+
+
+def order_applications(graphs, policy):
+    """Get the order in which the applications of a subframe are started.
+
+    The processes of applications that are started first enter the ready
+    queues of the schedulers first. With the FIFO scheduling of the
+    platforms, they are thus selected first whenever processes of several
+    applications are ready. The order is stable, such that applications of
+    the same priority keep their order in the trace. Supported policies are:
+
+    - ``criticality``: applications with a higher
+      :attr:`FivegGraph.priority` are started first.
+    - ``deadline``: applications with an earlier deadline are started first.
+
+    Args:
+        graphs (list of FivegGraph): the graphs of the applications
+        policy (str): the name of the policy
+
+    Returns:
+        list of int: the indices of the graphs in start order
+    """
+    if policy not in _orders:
+        raise ValueError(f"Unknown application priority policy: {policy}")
+    key = _orders[policy]
+    return sorted(range(len(graphs)), key=lambda i: key(graphs[i]))
+
+
+def _priority_key(process):
+    # higher priorities first
+    return -getattr(process.app, "priority", 0)
+
+
+def _priority_deadline_key(process):
+    # higher priorities first, then the earliest absolute deadline first
+    deadline = getattr(process.app, "deadline", None)
+    if deadline is None:
+        deadline = math.inf
+    return _priority_key(process), deadline
+
+
+class PriorityScheduler(FifoScheduler):
+    """A scheduler that selects the ready process of the highest priority.
+
+    The priority of a process is the priority of its application (see
+    :attr:`FivegGraph.priority`). Processes of the same priority are selected
+    in FIFO order.
+    """
+
+    key = staticmethod(_priority_key)
+
+    def schedule(self):
+        # FIXME: should not access a private member here
+        queue = self._ready_queue
+        if len(queue) > 1:
+            # min() returns the first of several equal processes, which
+            # preserves the FIFO order within a priority
+            process = min(queue, key=self.key)
+            if process is not queue[0]:
+                queue.remove(process)
+                queue.insert(0, process)
+        return super().schedule()
+
+
+class PriorityDeadlineScheduler(PriorityScheduler):
+    """A scheduler that selects the ready process of the highest priority.
+
+    Processes of the same priority are selected in the order of the absolute
+    deadlines of their applications (earliest deadline first), and then in
+    FIFO order.
+    """
+
+    key = staticmethod(_priority_deadline_key)
+
+
+_scheduler_policies = {
+    "priority": PriorityScheduler,
+    "priority_deadline": PriorityDeadlineScheduler,
+}
+
+
+def set_scheduler_policy(schedulers, policy):
+    """Let the given schedulers select ready processes by priority.
+
+    Supported policies are:
+
+    - ``priority``: the process of the application with the highest
+      :attr:`FivegGraph.priority` is selected first (fixed priority).
+    - ``priority_deadline``: like ``priority``, but processes of the same
+      priority are selected by the earliest absolute deadline.
+
+    The schedulers must use the FIFO policy of the platform. They must not
+    have been started yet.
+
+    Args:
+        schedulers (list of FifoScheduler): the schedulers of the system
+        policy (str): the name of the policy
+    """
+    if policy not in _scheduler_policies:
+        raise ValueError(f"Unknown scheduler policy: {policy}")
+    for scheduler in schedulers:
+        if not isinstance(scheduler, FifoScheduler):
+            raise ValueError(
+                f"The scheduler {scheduler.name} does not use the FIFO policy"
+            )
+        # the priority schedulers only override the selection of the next
+        # process, thus the type of existing schedulers can be changed
+        scheduler.__class__ = _scheduler_policies[policy]
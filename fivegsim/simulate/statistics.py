@@ -4,6 +4,7 @@
 # Author: Robert Khasanov
 
 from dataclasses import dataclass
+import math
 
 from mocasin.simulate.manager import (
     ManagerStatistics,
@@ -11,6 +12,10 @@ from mocasin.simulate.manager import (
 )
 
 
+# the criticality levels of the applications (see FivegGraph.timeout)
+_criticalities = (0, 1, 2)
+
+
 @dataclass
 class FiveGManagerStatisticsApplicationEntry(ManagerStatisticsApplicationEntry):
     """A log entry of the application scheduling with the runtime manager."""
@@ -35,3 +40,47 @@ class FiveGManagerStatistics(ManagerStatistics):
         )
         self.applications.append(entry)
         return entry
+
+    def summary(self):
+        """Summarize the statistics.
+
+        Returns:
+            dict: a dict mapping the columns of ``missrate.csv`` to their
+                values
+        """
+        summary = {}
+        summary["Total_apps"] = self.total_applications()
+        summary["Total_rejected"] = self.total_rejected()
+        summary["Missed_deadline"] = self.total_missed()
+        summary["Total_activations"] = self.total_activations()
+        summary["Total_scheduling_time"] = self.total_scheduling_time()
+        st_mean, st_std = self.scheduling_time_stats()
+        summary["Average_scheduling_time"] = st_mean
+        summary["Std_scheduling_time"] = st_std
+        for cri, (missed, total) in self.missed_by_criticality().items():
+            summary[f"Missed_deadline_cri{cri}"] = missed
+            summary[f"Total_apps_cri{cri}"] = total
+            summary[f"Miss_rate_cri{cri}"] = (
+                missed / total if total > 0 else math.nan
+            )
+        return summary
+
+    def missed_by_criticality(self):
+        """Count the accepted and missed applications of each criticality.
+
+        All criticality levels are included, even if no application of a
+        level was accepted.
+
+        Returns:
+            dict: a dict mapping each criticality to a tuple (missed
+                applications, accepted applications)
+        """
+        counts = dict.fromkeys(_criticalities, (0, 0))
+        for entry in self.applications:
+            if not entry.accepted:
+                continue
+            missed, accepted = counts.get(entry.criticality, (0, 0))
+            if entry.missed_deadline:
+                missed += 1
+            counts[entry.criticality] = (missed, accepted + 1)
+        return dict(sorted(counts.items()))
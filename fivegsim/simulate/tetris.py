@@ -10,10 +10,20 @@ from fivegsim.simulate import FiveGRuntimeDataflowApplication
 
 
 class FiveGRuntimeTetrisManager(RuntimeTetrisManager):
-    def __init__(self, resource_manager, system, cfg, stats=None):
-        """Tetris Manager for FiveG applications."""
+    def __init__(
+        self, resource_manager, system, cfg, stats=None, pareto_cache=None
+    ):
+        """Tetris Manager for FiveG applications.
+
+        An existing ``pareto_cache`` for the same platform may be passed in
+        to reuse the Pareto fronts generated by previous simulations.
+        """
         super().__init__(resource_manager, system, stats)
-        self.pareto_cache = FiveGParetoFrontCache(self.system.platform, cfg)
+        if pareto_cache is None:
+            pareto_cache = FiveGParetoFrontCache(self.system.platform, cfg)
+            # load all precomputed Pareto fronts at startup
+            pareto_cache.preload()
+        self.pareto_cache = pareto_cache
 
     def start_applications(self, graphs, traces):
         """Start new applications."""
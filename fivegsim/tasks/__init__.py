@@ -0,0 +1,56 @@
+# Copyright (C) 2021 TU Dresden
+# Licensed under the ISC license (see LICENSE.txt)
+#
+# Authors: Christian Menard
+
+"""Tasks provided by the fivegsim entry point.
+
+Each task is described by a tuple of the module and the function
+implementing the task, the name of its primary config and a short
+description.
+"""
+
+_tasks = {
+    "simulate": (
+        "mocasin.tasks.simulate",
+        "simulate",
+        "fivegsim",
+        "Simulate the processing of a 5G trace (default)",
+    ),
+    "precompute_pareto": (
+        "fivegsim.tasks.precompute_pareto",
+        "precompute_pareto",
+        "precompute_pareto",
+        "Precompute the Pareto fronts used by TETRiS in parallel",
+    ),
+    "benchmark_platform": (
+        "fivegsim.tasks.benchmark_platform",
+        "benchmark_platform",
+        "benchmark_platform",
+        "Measure the platform construction time with and without cache",
+    ),
+    "provision_accelerators": (
+        "fivegsim.tasks.provision_accelerators",
+        "provision_accelerators",
+        "provision_accelerators",
+        "Search for the cheapest accelerator mix meeting a miss rate target",
+    ),
+    "sweep": (
+        "fivegsim.tasks.sweep",
+        "sweep",
+        "sweep",
+        "Simulate a parameter grid in forked processes sharing loaded state",
+    ),
+    "serve": (
+        "fivegsim.tasks.serve",
+        "serve",
+        "serve",
+        "Run simulations submitted to a spool directory in warm workers",
+    ),
+    "validate_analytical": (
+        "fivegsim.tasks.validate_analytical",
+        "validate_analytical",
+        "validate_analytical",
+        "Compare the analytical estimate with the simulation of traces",
+    ),
+}
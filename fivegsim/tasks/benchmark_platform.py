@@ -0,0 +1,47 @@
+# Copyright (C) 2021 TU Dresden
+# Licensed under the ISC license (see LICENSE.txt)
+#
+# Authors: Christian Menard
+
+import logging
+import os
+import timeit
+
+import hydra
+
+from fivegsim.platforms.cache import instantiate_platform, platform_cache_file
+
+log = logging.getLogger(__name__)
+
+
+def benchmark_platform(cfg):
+    """Measure the time it takes to construct the platform.
+
+    The platform is constructed ``benchmark_platform.repetitions`` times
+    without the platform cache, and the same number of times from the cache
+    given by ``platform_cache_dir``. The cache is populated before the
+    measurement if needed.
+
+    Args:
+        cfg(~omegaconf.dictconfig.DictConfig): the hydra configuration object
+    """
+    cache_dir = hydra.utils.to_absolute_path(cfg["platform_cache_dir"])
+    repetitions = cfg["benchmark_platform"]["repetitions"]
+
+    uncached = timeit.repeat(
+        lambda: instantiate_platform(cfg), number=1, repeat=repetitions
+    )
+
+    # populate the cache
+    instantiate_platform(cfg, cache_dir)
+    if not os.path.isfile(platform_cache_file(cfg, cache_dir)):
+        raise RuntimeError("The platform could not be stored in the cache")
+
+    cached = timeit.repeat(
+        lambda: instantiate_platform(cfg, cache_dir),
+        number=1,
+        repeat=repetitions,
+    )
+
+    print(f"Uncached platform construction: {min(uncached) * 1000:.3f} ms")
+    print(f"Cached platform construction: {min(cached) * 1000:.3f} ms")
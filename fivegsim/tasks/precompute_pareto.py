@@ -0,0 +1,133 @@
+# Copyright (C) 2021 TU Dresden
+# Licensed under the ISC license (see LICENSE.txt)
+#
+# Authors: Christian Menard
+
+import concurrent.futures
+import itertools
+import logging
+
+import hydra
+from omegaconf import OmegaConf
+
+from fivegsim.graph import FivegGraph
+from fivegsim.mapper.pareto import FiveGParetoFrontCache
+from fivegsim.platforms.cache import instantiate_platform
+from fivegsim.trace import FivegTrace
+from fivegsim.util.cost_model import get_task_costs
+from fivegsim.util.trace_file_manager import TraceFileManager
+
+log = logging.getLogger(__name__)
+
+# the state of a worker process, initialized by _init_worker
+_worker = {}
+
+
+def _init_worker(cfg_container):
+    cfg = OmegaConf.create(cfg_container)
+    platform = instantiate_platform(cfg, cfg["platform_cache_dir"])
+    _worker["cfg"] = cfg
+    _worker["cache"] = FiveGParetoFrontCache(platform, cfg)
+    _worker["proc_time"] = get_task_costs(cfg["task_file"], cfg["cost_model"])
+
+
+def _generate_pareto_front(prbs, mod, layers):
+    cfg = _worker["cfg"]
+    ntrace = TraceFileManager.Trace(
+        PRBs=prbs, layers=layers, modulation_scheme=mod, UE_criticality=0
+    )
+    graph = FivegGraph(
+        f"fiveg_prbs{prbs}_mod{mod}_lay{layers}", ntrace, cfg["antennas"]
+    )
+    trace = FivegTrace(ntrace, _worker["proc_time"], cfg["antennas"])
+    pareto_front = _worker["cache"].get_pareto_front(graph, trace)
+    return graph.name, len(pareto_front)
+
+
+def _trace_invariants(trace_file):
+    """Collect all (prbs, mod, layers) combinations found in a trace."""
+    invariants = set()
+    for subframe in TraceFileManager(trace_file).TF_subframes:
+        for ntrace in subframe.trace:
+            invariants.add(
+                (ntrace.PRBs, ntrace.modulation_scheme, ntrace.layers)
+            )
+    return invariants
+
+
+def _grid_invariants(proc_time, layers):
+    """Collect all (prbs, mod, layers) combinations supported by the costs.
+
+    Only PRBs and modulation schemes with costs for all core types are
+    considered. The core types are all processor types of the mf kernel
+    except for accelerators.
+    """
+    core_types = [t for t in proc_time["mf"] if not t.startswith("acc_")]
+    prbs = set.intersection(*(set(proc_time["mf"][t]) for t in core_types))
+    mods = set.intersection(*(set(proc_time["demap"][t]) for t in core_types))
+    return set(itertools.product(prbs, mods, layers))
+
+
+def precompute_pareto(cfg):
+    """Precompute the Pareto fronts used by the TETRiS runtime.
+
+    This task generates the Pareto fronts for all combinations of PRBs,
+    modulation scheme and layers in a process pool and stores them in the
+    Pareto front cache given by ``pareto_cache_dir``. By default, all
+    combinations found in ``trace_file`` are considered. If
+    ``precompute_pareto.full_grid`` is set, the task covers all PRBs and
+    modulation schemes found in the task file with the layers given in
+    ``precompute_pareto.layers``. A subsequent simulation with the same
+    configuration loads the cache at startup. Interpolation of Pareto fronts
+    is disabled, such that each front is generated and stored.
+
+    Args:
+        cfg(~omegaconf.dictconfig.DictConfig): the hydra configuration object
+    """
+    if not cfg["pareto_cache_dir"]:
+        raise ValueError(
+            "precompute_pareto requires pareto_cache_dir to be set"
+        )
+
+    # resolve all paths, as the workers are not aware of hydra's working dir
+    cfg = OmegaConf.create(OmegaConf.to_container(cfg, resolve=True))
+    cfg["task_file"] = hydra.utils.to_absolute_path(cfg["task_file"])
+    cfg["pareto_cache_dir"] = hydra.utils.to_absolute_path(
+        cfg["pareto_cache_dir"]
+    )
+    if cfg["platform_cache_dir"]:
+        cfg["platform_cache_dir"] = hydra.utils.to_absolute_path(
+            cfg["platform_cache_dir"]
+        )
+
+    if cfg["pareto_prb_interpolation"]:
+        log.info(
+            "Disabling Pareto front interpolation, as interpolated fronts "
+            "are not stored in the cache"
+        )
+        cfg["pareto_prb_interpolation"] = False
+
+    settings = cfg["precompute_pareto"]
+    if settings["full_grid"]:
+        proc_time = get_task_costs(cfg["task_file"], cfg["cost_model"])
+        invariants = _grid_invariants(proc_time, settings["layers"])
+    else:
+        trace_file = hydra.utils.to_absolute_path(cfg["trace_file"])
+        invariants = _trace_invariants(trace_file)
+
+    log.info(f"Generating {len(invariants)} Pareto fronts")
+    cfg_container = OmegaConf.to_container(cfg)
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=settings["jobs"],
+        initializer=_init_worker,
+        initargs=(cfg_container,),
+    ) as executor:
+        futures = [
+            executor.submit(_generate_pareto_front, *invariant)
+            for invariant in sorted(invariants)
+        ]
+        for future in concurrent.futures.as_completed(futures):
+            name, size = future.result()
+            log.info(f"Generated the Pareto front of {name} ({size} mappings)")
+
+    print(f"Precomputed Pareto fronts: {len(invariants)}")
@@ -0,0 +1,183 @@
+# Copyright (C) 2021 TU Dresden
+# Licensed under the ISC license (see LICENSE.txt)
+#
+# Authors: Christian Menard
+
+import concurrent.futures
+import csv
+import logging
+import math
+
+from omegaconf import OmegaConf
+
+from fivegsim.tasks.runner import resolve_config, run_simulation
+from fivegsim.util.trace_file_manager import TraceFileManager
+
+log = logging.getLogger(__name__)
+
+
+def _directory(counts):
+    return "_".join(f"{kind}{num}" for kind, num in counts.items())
+
+
+def _evaluate(cfg_container, counts):
+    """Simulate the platform with the given number of accelerators."""
+    cfg = OmegaConf.create(cfg_container)
+    for kind, num in counts.items():
+        cfg["platform"][f"num_{kind}_acc"] = num
+    simulation = run_simulation(cfg, _directory(counts))
+    summary = simulation.stats.summary()
+    static_power = sum(
+        pe.static_power() for pe in simulation.platform.processors()
+    )
+    return {
+        **counts,
+        "static_power": static_power,
+        "missed": summary["Missed_deadline"],
+        "rejected": summary["Total_rejected"],
+        # the number of applications that arrived before a simulation was
+        # aborted tells how far it got into the trace
+        "applications": summary["Total_apps"],
+        "aborted": simulation.aborted,
+    }
+
+
+def _rank(result):
+    """Get the key for selecting the best candidate of a step.
+
+    Complete simulations are preferred by their miss rate. Aborted simulations
+    all missed just over the allowed number of applications, thus they are
+    preferred by how far they got into the trace before they were aborted.
+    Ties are broken by the static power.
+    """
+    if result["aborted"]:
+        return (1, -result["applications"], result["static_power"])
+    return (0, result["miss_rate"], result["static_power"])
+
+
+def _pareto_set(results):
+    """Select the results that are Pareto-optimal in power and miss rate.
+
+    The miss rate of an aborted simulation is only a lower bound. An aborted
+    result is part of the set unless a complete result is known to dominate
+    it, but it does not dominate any other result.
+    """
+    results = list(results)
+    complete = [r for r in results if not r["aborted"]]
+    pareto = []
+    for r in results:
+        dominated = any(
+            o["static_power"] <= r["static_power"]
+            and o["miss_rate"] <= r["miss_rate"]
+            and (
+                o["static_power"] < r["static_power"]
+                or o["miss_rate"] < r["miss_rate"]
+            )
+            for o in complete
+        )
+        if not dominated:
+            pareto.append(r)
+    return pareto
+
+
+def provision_accelerators(cfg):
+    """Search for the cheapest accelerator mix that meets a miss rate target.
+
+    Starting from the accelerators configured for the platform, this task
+    greedily adds one accelerator at a time. In each step, all platforms with
+    one additional accelerator of one of the kinds given in
+    ``provision_accelerators.accelerators`` are simulated in a process pool.
+    The search continues with the candidate with the lowest miss rate, i.e.,
+    the fraction of missed and rejected applications, preferring the
+    candidate with the lower static power on ties. It stops once the miss
+    rate is at most ``provision_accelerators.target_miss_rate`` or no more
+    accelerators can be added.
+
+    A candidate stops simulating as soon as it missed or rejected so many
+    applications that it cannot meet the target anymore. If all candidates of
+    a step were aborted, the search continues with the candidate that
+    processed the most applications before it was aborted. All evaluated
+    candidates are written to ``provisioning.csv`` together with a flag
+    marking the Pareto set of static power and miss rate. For aborted
+    candidates, the miss rate is a lower bound.
+
+    Args:
+        cfg(~omegaconf.dictconfig.DictConfig): the hydra configuration object
+    """
+    cfg = resolve_config(cfg)
+    settings = cfg["provision_accelerators"]
+    target = settings["target_miss_rate"]
+    kinds = list(settings["accelerators"])
+
+    # the miss rate of a candidate is known to exceed the target once it
+    # missed or rejected more applications than allowed for the entire trace
+    total = sum(
+        len(subframe.trace)
+        for subframe in TraceFileManager(cfg["trace_file"]).TF_subframes
+    )
+    cfg["max_missed_deadlines"] = math.floor(target * total)
+    cfg_container = OmegaConf.to_container(cfg)
+
+    results = {}
+
+    def evaluate(executor, candidates):
+        candidates = [c for c in candidates if tuple(c.values()) not in results]
+        futures = [
+            executor.submit(_evaluate, cfg_container, c) for c in candidates
+        ]
+        for future in concurrent.futures.as_completed(futures):
+            result = future.result()
+            result["miss_rate"] = (
+                result["missed"] + result["rejected"]
+            ) / total
+            results[tuple(result[kind] for kind in kinds)] = result
+            log.info(
+                f"{_directory({k: result[k] for k in kinds})}: "
+                f"static power {result['static_power']:.4f} W, "
+                f"miss rate {result['miss_rate']:.4f}"
+                + (" (aborted)" if result["aborted"] else "")
+            )
+
+    current = {
+        kind: cfg["platform"].get(f"num_{kind}_acc", 0) for kind in kinds
+    }
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=settings["jobs"]
+    ) as executor:
+        evaluate(executor, [current])
+        while True:
+            result = results[tuple(current.values())]
+            if not result["aborted"] and result["miss_rate"] <= target:
+                break
+            candidates = []
+            for kind in kinds:
+                if current[kind] < settings["max_per_accelerator"]:
+                    candidates.append({**current, kind: current[kind] + 1})
+            if not candidates:
+                break
+            evaluate(executor, candidates)
+            current = min(
+                candidates, key=lambda c: _rank(results[tuple(c.values())])
+            )
+
+    pareto = _pareto_set(results.values())
+    with open("provisioning.csv", "x") as file:
+        writer = csv.writer(file, delimiter=",", lineterminator="\n")
+        columns = kinds + [
+            "static_power",
+            "missed",
+            "rejected",
+            "miss_rate",
+            "applications",
+            "aborted",
+        ]
+        writer.writerow(columns + ["pareto"])
+        for result in sorted(results.values(), key=lambda r: r["static_power"]):
+            writer.writerow([result[c] for c in columns] + [result in pareto])
+
+    result = results[tuple(current.values())]
+    if not result["aborted"] and result["miss_rate"] <= target:
+        print(f"Accelerators: {_directory(current)}")
+        print(f"Static power: {result['static_power']:.4f} W")
+    else:
+        print("Target miss rate not reached")
@@ -0,0 +1,80 @@
+# Copyright (C) 2021 TU Dresden
+# Licensed under the ISC license (see LICENSE.txt)
+#
+# Authors: Christian Menard
+
+"""Run simulations within the current process.
+
+The tasks that run many simulations use these helpers instead of spawning a
+``fivegsim`` process for each simulation.
+"""
+
+import contextlib
+import io
+import os
+
+import hydra
+from omegaconf import OmegaConf
+
+from fivegsim.simulate import FiveGSimulation
+
+
+def resolve_config(cfg):
+    """Resolve all interpolations and relative paths of a configuration.
+
+    The resulting configuration can be passed to other processes, which are
+    not aware of hydra's working directory.
+    """
+    cfg = OmegaConf.create(OmegaConf.to_container(cfg, resolve=True))
+    for key in [
+        "trace_file",
+        "task_file",
+        "pareto_cache_dir",
+        "platform_cache_dir",
+        "result_cache_dir",
+        "results_db",
+    ]:
+        if cfg.get(key):
+            cfg[key] = hydra.utils.to_absolute_path(cfg[key])
+    return cfg
+
+
+def run_simulation(cfg, directory, quiet=True, **kwargs):
+    """Run a single simulation in the given directory.
+
+    The statistics files of the simulation are written to ``directory``,
+    which is created if needed. The working directory is restored afterwards.
+
+    Args:
+        cfg (DictConfig): a resolved configuration (see
+            :func:`resolve_config`)
+        directory (str): the directory to run the simulation in
+        quiet (bool): suppress the output of the simulation
+        **kwargs: passed on to :class:`FiveGSimulation`. If not given, the
+            trace and task files are taken from the configuration. If a
+            ``platform`` is given, it is used instead of instantiating the
+            platform of the configuration.
+
+    Returns:
+        FiveGSimulation: the simulation after it finished
+    """
+    kwargs.setdefault("trace_file", cfg["trace_file"])
+    kwargs.setdefault("task_file", cfg["task_file"])
+
+    os.makedirs(directory, exist_ok=True)
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        with contextlib.ExitStack() as stack:
+            if quiet:
+                stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+            platform = kwargs.pop("platform", None)
+            if platform is None:
+                simulation = FiveGSimulation.from_hydra(cfg, **kwargs)
+            else:
+                simulation = FiveGSimulation(platform, cfg, **kwargs)
+            with simulation:
+                simulation.run()
+    finally:
+        os.chdir(cwd)
+    return simulation
@@ -0,0 +1,298 @@
+# Copyright (C) 2021 TU Dresden
+# Licensed under the ISC license (see LICENSE.txt)
+#
+# Authors: Christian Menard
+
+import concurrent.futures
+import csv
+import fcntl
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+import time
+import traceback
+
+import hydra
+from omegaconf import OmegaConf
+
+from fivegsim.mapper.pareto import FiveGParetoFrontCache
+from fivegsim.platforms.cache import instantiate_platform
+from fivegsim.tasks.runner import resolve_config, run_simulation
+from fivegsim.util.cache import config_hash
+from fivegsim.util.cost_model import get_task_costs
+
+log = logging.getLogger(__name__)
+
+# the state of a worker process, initialized by _init_worker and extended by
+# each job that needs a platform or costs not seen before
+_worker = {}
+
+
+def _platform(cfg):
+    """Get a fresh copy of the platform of a configuration.
+
+    A simulation modifies its platform, e.g., the scheduling policies. Thus,
+    the worker keeps a pickled snapshot of each platform and each job gets
+    its own copy. Unpickling is much faster than constructing the platform.
+    Platforms that cannot be pickled are constructed for each job.
+    """
+    key = config_hash(cfg, keys=["platform"])
+    if key not in _worker["platforms"]:
+        platform = instantiate_platform(cfg, cfg["platform_cache_dir"])
+        try:
+            _worker["platforms"][key] = pickle.dumps(
+                platform, protocol=pickle.HIGHEST_PROTOCOL
+            )
+        except (pickle.PicklingError, AttributeError, TypeError) as e:
+            log.warning(f"Cannot snapshot the platform: {e}")
+            _worker["platforms"][key] = None
+            return platform
+    snapshot = _worker["platforms"][key]
+    if snapshot is None:
+        return instantiate_platform(cfg, cfg["platform_cache_dir"])
+    return pickle.loads(snapshot)
+
+
+def _costs(cfg):
+    # the task execution times are only read by the simulation and can be
+    # shared by all jobs
+    key = config_hash(cfg, keys=["task_file", "cost_model"])
+    if key not in _worker["costs"]:
+        _worker["costs"][key] = get_task_costs(
+            cfg["task_file"], cfg["cost_model"]
+        )
+    return _worker["costs"][key]
+
+
+def _init_worker(cfg_container):
+    cfg = OmegaConf.create(cfg_container)
+    _worker["platforms"] = {}
+    _worker["costs"] = {}
+    # warm up with the state needed by the base configuration
+    _platform(cfg)
+    _costs(cfg)
+
+
+def _run_job(cfg_container, job_file, spool_dir, directory):
+    """Run the simulation described by a job file in the given directory."""
+    cfg = OmegaConf.create(cfg_container)
+    cfg = OmegaConf.merge(cfg, OmegaConf.load(job_file))
+    # paths in the job file are relative to the spool directory
+    for key in ["trace_file", "task_file"]:
+        if cfg[key]:
+            cfg[key] = os.path.join(spool_dir, cfg[key])
+
+    platform = _platform(cfg)
+    pareto_cache = None
+    if cfg["tetris_runtime"]:
+        # the Pareto fronts refer to the processors of the platform, thus
+        # each job needs its own cache. Fronts from previous jobs are only
+        # reused via the disk cache.
+        pareto_cache = FiveGParetoFrontCache(platform, cfg)
+        pareto_cache.preload()
+    simulation = run_simulation(
+        cfg,
+        directory,
+        platform=platform,
+        proc_time=_costs(cfg),
+        pareto_cache=pareto_cache,
+    )
+    return simulation.stats.summary()
+
+
+def _write_atomically(path, write):
+    """Write a file such that readers never see a partial file."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w") as file:
+        write(file)
+    os.replace(tmp_path, path)
+
+
+def _file_id(path):
+    """Identify a file by its inode and modification time, None if missing."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns)
+
+
+def _register_server(running_dir):
+    """Create the running directory of this server and lock it.
+
+    The lock is held until the server process terminates. Thus, other servers
+    can detect the jobs of servers that terminated unexpectedly. The
+    directory is only renamed to its final name once it is locked, such that
+    other servers never see an unlocked directory of a live server.
+
+    Returns:
+        tuple: the running directory of this server and the open lock file
+    """
+    directory = tempfile.mkdtemp(dir=running_dir, prefix=".new-")
+    lock = open(os.path.join(directory, "lock"), "w")
+    fcntl.flock(lock, fcntl.LOCK_EX)
+    server_dir = os.path.join(
+        running_dir, "server-" + os.path.basename(directory)[len(".new-") :]
+    )
+    os.rename(directory, server_dir)
+    return server_dir, lock
+
+
+def _fail_orphaned_jobs(running_dir, results_dir):
+    """Mark the jobs of servers that terminated unexpectedly as failed.
+
+    The jobs are not requeued, as they might have caused the termination.
+    """
+    for name in sorted(os.listdir(running_dir)):
+        if not name.startswith("server-"):
+            continue
+        server_dir = os.path.join(running_dir, name)
+        try:
+            lock = open(os.path.join(server_dir, "lock"), "a")
+        except FileNotFoundError:
+            # the directory was just cleaned up by another server
+            continue
+        with lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # the server is still alive
+                continue
+            for job_name in sorted(os.listdir(server_dir)):
+                if not job_name.endswith(".yaml"):
+                    continue
+                job = os.path.splitext(job_name)[0]
+                log.error(f"Job {job} was orphaned by a terminated server")
+                _write_atomically(
+                    os.path.join(results_dir, f"{job}.error"),
+                    lambda file: file.write(
+                        "The server terminated while running the job\n"
+                    ),
+                )
+            shutil.rmtree(server_dir)
+
+
+def _finish_job(future, name, running_dir, results_dir):
+    """Store the result of a job and remove it from the running jobs."""
+    job = os.path.splitext(name)[0]
+    try:
+        summary = future.result()
+    except Exception:
+        log.error(f"Job {job} failed")
+        error = traceback.format_exc()
+        _write_atomically(
+            os.path.join(results_dir, f"{job}.error"),
+            lambda file: file.write(error),
+        )
+    else:
+        log.info(f"Job {job} finished")
+
+        def write(file):
+            writer = csv.writer(file, delimiter=",", lineterminator="\n")
+            writer.writerow(summary.keys())
+            writer.writerow(summary.values())
+
+        _write_atomically(os.path.join(results_dir, f"{job}.csv"), write)
+    os.remove(os.path.join(running_dir, name))
+
+
+def serve(cfg):
+    """Run simulations submitted to a spool directory.
+
+    The server keeps a pool of worker processes that hold the platforms and
+    task execution times of previous jobs, such that subsequent jobs avoid
+    the startup cost of a ``fivegsim`` invocation. Jobs are
+    submitted by placing a YAML file in the ``incoming`` directory of
+    ``serve.spool_dir``. The file overrides the configuration the server was
+    started with, e.g.::
+
+        trace_file: traces/lte_trace_1.csv
+        load_balancer: true
+
+    Relative paths are interpreted relative to the spool directory. Job files
+    should be written under a different name and renamed to ``<job>.yaml``
+    once complete. The server moves each job to the ``running`` directory and
+    writes the ``missrate.csv`` equivalent summary of the job to
+    ``results/<job>.csv``, or the error to ``results/<job>.error`` if the job
+    failed. The statistics files of the job are stored in ``results/<job>``.
+    Several servers may share a spool directory. A server shuts down after
+    finishing its running jobs once a file called ``shutdown`` is created or
+    touched in the spool directory. A ``shutdown`` file that already existed
+    when the server started is ignored.
+
+    Each server keeps its running jobs in a locked subdirectory of
+    ``running``. At startup, the jobs of servers that terminated without
+    finishing them are marked as failed.
+
+    The workers cache the platforms and task execution times of previous
+    jobs. Each job still starts from a clean state. It gets an unpickled
+    copy of the platform and its own Pareto front cache, which is populated
+    from ``pareto_cache_dir`` if set.
+
+    Args:
+        cfg(~omegaconf.dictconfig.DictConfig): the hydra configuration object
+    """
+    settings = cfg["serve"]
+    spool_dir = hydra.utils.to_absolute_path(settings["spool_dir"])
+    incoming_dir = os.path.join(spool_dir, "incoming")
+    running_dir = os.path.join(spool_dir, "running")
+    results_dir = os.path.join(spool_dir, "results")
+    shutdown_file = os.path.join(spool_dir, "shutdown")
+    for directory in [incoming_dir, running_dir, results_dir]:
+        os.makedirs(directory, exist_ok=True)
+
+    # a shutdown file left by previous servers does not stop this server
+    stale_shutdown = _file_id(shutdown_file)
+    server_dir, lock = _register_server(running_dir)
+    _fail_orphaned_jobs(running_dir, results_dir)
+
+    cfg = resolve_config(cfg)
+    cfg_container = OmegaConf.to_container(cfg)
+
+    finished = 0
+    running = {}
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=settings["jobs"],
+        initializer=_init_worker,
+        initargs=(cfg_container,),
+    ) as executor:
+        log.info(f"Waiting for jobs in {incoming_dir}")
+        while _file_id(shutdown_file) in (None, stale_shutdown):
+            for name in sorted(os.listdir(incoming_dir)):
+                if not name.endswith(".yaml"):
+                    continue
+                job_file = os.path.join(server_dir, name)
+                try:
+                    os.rename(os.path.join(incoming_dir, name), job_file)
+                except FileNotFoundError:
+                    # the job was taken by another server
+                    continue
+                job = os.path.splitext(name)[0]
+                log.info(f"Starting job {job}")
+                future = executor.submit(
+                    _run_job,
+                    cfg_container,
+                    job_file,
+                    spool_dir,
+                    os.path.join(results_dir, job),
+                )
+                running[future] = name
+
+            for future in [f for f in running if f.done()]:
+                name = running.pop(future)
+                _finish_job(future, name, server_dir, results_dir)
+                finished += 1
+
+            time.sleep(settings["poll_interval"])
+
+        log.info("Shutting down")
+        for future in concurrent.futures.as_completed(running):
+            name = running[future]
+            _finish_job(future, name, server_dir, results_dir)
+            finished += 1
+
+    shutil.rmtree(server_dir)
+    lock.close()
+    print(f"Finished jobs: {finished}")
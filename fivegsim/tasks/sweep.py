@@ -0,0 +1,125 @@
+# Copyright (C) 2021 TU Dresden
+# Licensed under the ISC license (see LICENSE.txt)
+#
+# Authors: Christian Menard
+
+import csv
+import itertools
+import logging
+import multiprocessing
+
+from omegaconf import OmegaConf
+
+from fivegsim.platforms.cache import instantiate_platform
+from fivegsim.tasks.runner import resolve_config, run_simulation
+from fivegsim.util.cache import config_hash
+from fivegsim.util.cost_model import get_task_costs
+from fivegsim.util.trace_file_manager import TraceFileManager
+
+log = logging.getLogger(__name__)
+
+# the state shared with the worker processes. It is set up before the workers
+# are forked, such that they inherit it without loading or pickling it.
+_sweep = {}
+
+
+def _flatten(grid, prefix=""):
+    """Flatten a nested grid to a dict mapping dotted keys to value lists."""
+    flat = {}
+    for key, values in grid.items():
+        if isinstance(values, dict):
+            flat.update(_flatten(values, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = values
+    return flat
+
+
+def _grid_points(cfg, grid):
+    """Create a configuration for each point of the grid."""
+    grid = _flatten(grid)
+    keys = list(grid.keys())
+    points = []
+    for values in itertools.product(*(grid[key] for key in keys)):
+        point_cfg = OmegaConf.create(OmegaConf.to_container(cfg))
+        for key, value in zip(keys, values):
+            OmegaConf.update(point_cfg, key, value, merge=True)
+        points.append((dict(zip(keys, values)), point_cfg))
+    return points
+
+
+def _run_point(index):
+    params, cfg = _sweep["points"][index]
+    platform = _sweep["platforms"][config_hash(cfg, keys=["platform"])]
+    trace = _sweep["traces"][cfg["trace_file"]]
+    costs_key = config_hash(cfg, keys=["task_file", "cost_model"])
+    proc_time = _sweep["costs"][costs_key]
+    simulation = run_simulation(
+        cfg,
+        f"point_{index:04d}",
+        platform=platform,
+        trace_file_manager=trace,
+        proc_time=proc_time,
+    )
+    return {
+        **params,
+        **simulation.stats.summary(),
+        "Simulated_time": simulation.result.exec_time / 1000000000.0,
+    }
+
+
+def sweep(cfg):
+    """Simulate all points of a parameter grid.
+
+    The grid is given by ``sweep.grid``, a (nested) dict mapping config keys
+    to lists of values, e.g., ``+sweep.grid.platform.num_fft_acc=[1,2]``.
+    Config groups cannot be swept, as the configuration is not composed again
+    for each point. The platforms, traces and task execution times needed by the
+    grid points are loaded once. Then, each point is simulated in a worker
+    process that is forked from this process and thus inherits the loaded
+    state. The workers are not reused, such that each simulation starts from
+    the same state. Each simulation runs in its own directory, and the
+    summaries of all simulations are written to ``sweep.csv``.
+
+    Args:
+        cfg(~omegaconf.dictconfig.DictConfig): the hydra configuration object
+    """
+    settings = cfg["sweep"]
+    grid = OmegaConf.to_container(settings["grid"], resolve=True)
+    cfg = resolve_config(cfg)
+    points = _grid_points(cfg, grid)
+
+    # load everything the simulations share
+    _sweep["points"] = points
+    _sweep["platforms"] = {}
+    _sweep["traces"] = {}
+    _sweep["costs"] = {}
+    for _, point_cfg in points:
+        key = config_hash(point_cfg, keys=["platform"])
+        if key not in _sweep["platforms"]:
+            _sweep["platforms"][key] = instantiate_platform(
+                point_cfg, point_cfg["platform_cache_dir"]
+            )
+        trace_file = point_cfg["trace_file"]
+        if trace_file not in _sweep["traces"]:
+            _sweep["traces"][trace_file] = TraceFileManager(trace_file)
+        key = config_hash(point_cfg, keys=["task_file", "cost_model"])
+        if key not in _sweep["costs"]:
+            _sweep["costs"][key] = get_task_costs(
+                point_cfg["task_file"], point_cfg["cost_model"]
+            )
+    log.info(
+        f"Loaded {len(_sweep['platforms'])} platforms and "
+        f"{len(_sweep['traces'])} traces for {len(points)} grid points"
+    )
+
+    context = multiprocessing.get_context("fork")
+    with context.Pool(settings["jobs"], maxtasksperchild=1) as pool:
+        results = pool.map(_run_point, range(len(points)), chunksize=1)
+
+    columns = list(dict.fromkeys(c for r in results for c in r.keys()))
+    with open("sweep.csv", "x") as file:
+        writer = csv.DictWriter(file, columns, lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(results)
+
+    print(f"Simulated grid points: {len(points)}")
@@ -0,0 +1,111 @@
+# Copyright (C) 2021 TU Dresden
+# Licensed under the ISC license (see LICENSE.txt)
+#
+# Authors: Christian Menard
+
+import csv
+import logging
+import os
+import statistics
+import time
+
+import hydra
+
+from fivegsim.tasks.runner import resolve_config, run_simulation
+
+log = logging.getLogger(__name__)
+
+
+def _run(cfg, trace_file, analytical):
+    """Run a simulation of a trace and measure its wall-clock time."""
+    cfg = cfg.copy()
+    cfg["trace_file"] = trace_file
+    cfg["analytical"] = analytical
+    # the result cache would distort the measured time
+    cfg["result_cache_dir"] = None
+    mode = "analytical" if analytical else "simulation"
+    name = os.path.splitext(os.path.basename(trace_file))[0]
+    start = time.perf_counter()
+    simulation = run_simulation(cfg, os.path.join(name, mode))
+    return simulation, time.perf_counter() - start
+
+
+def _compare(simulated, estimated):
+    """Compare the application statistics of a simulation and an estimate.
+
+    Returns:
+        dict: the accuracy metrics of the estimate
+    """
+    simulated_apps = {a.name: a for a in simulated.stats.applications}
+    both = [
+        (simulated_apps[a.name], a)
+        for a in estimated.stats.applications
+        if a.accepted and simulated_apps[a.name].accepted
+    ]
+    # the latency error in ms
+    errors = [
+        abs((e.end_time - e.start_time) - (s.end_time - s.start_time))
+        / 1000000000.0
+        for s, e in both
+    ]
+    agreement = sum(s.missed_deadline == e.missed_deadline for s, e in both)
+    return {
+        "Total_apps": len(simulated_apps),
+        "Missed_deadline_simulation": simulated.stats.total_missed(),
+        "Missed_deadline_analytical": estimated.stats.total_missed(),
+        "Miss_agreement": agreement / len(both) if both else 1.0,
+        "Mean_latency_error": statistics.mean(errors) if errors else 0.0,
+        "Max_latency_error": max(errors, default=0.0),
+    }
+
+
+def validate_analytical(cfg):
+    """Compare the analytical estimate with the simulation.
+
+    Each trace in ``validate_analytical.trace_files`` is simulated and
+    estimated analytically (see :class:`AnalyticalEstimator`) with the same
+    configuration. For each trace, the deadline misses, the fraction of
+    applications whose deadline miss is predicted correctly, the mean and
+    maximum error of the application latency (in ms) and the wall-clock
+    times of both modes are written to ``analytical_accuracy.csv``.
+
+    Args:
+        cfg(~omegaconf.dictconfig.DictConfig): the hydra configuration object
+    """
+    trace_files = [
+        hydra.utils.to_absolute_path(f)
+        for f in cfg["validate_analytical"]["trace_files"]
+    ]
+    cfg = resolve_config(cfg)
+
+    rows = []
+    for trace_file in trace_files:
+        simulated, simulation_time = _run(cfg, trace_file, False)
+        estimated, analytical_time = _run(cfg, trace_file, True)
+        row = {
+            "Trace": os.path.basename(trace_file),
+            **_compare(simulated, estimated),
+            "Simulation_time": simulation_time,
+            "Analytical_time": analytical_time,
+            "Speedup": simulation_time / analytical_time,
+        }
+        log.info(
+            f"{row['Trace']}: miss agreement {row['Miss_agreement']:.3f}, "
+            f"mean latency error {row['Mean_latency_error']:.4f} ms, "
+            f"speedup {row['Speedup']:.1f}"
+        )
+        rows.append(row)
+
+    with open("analytical_accuracy.csv", "x") as file:
+        writer = csv.DictWriter(file, rows[0].keys(), lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(rows)
+
+    for row in rows:
+        print(
+            f"{row['Trace']}: "
+            f"missed {row['Missed_deadline_simulation']} (simulation) / "
+            f"{row['Missed_deadline_analytical']} (analytical), "
+            f"mean latency error {row['Mean_latency_error']:.4f} ms, "
+            f"speedup {row['Speedup']:.1f}"
+        )
@@ -13,7 +13,7 @@ from mocasin.common.trace import (
 )
 
 from fivegsim.graph.phybench import Phybench
-from fivegsim.util.proc_tgff_reader import get_task_time
+from fivegsim.util.cost_model import get_task_costs
 
 
 class FivegTrace(DataflowTrace):
@@ -56,55 +56,54 @@ class FivegTrace(DataflowTrace):
         prbs = ntrace.PRBs
         mod = ntrace.modulation_scheme
 
+        # the general purpose core types found in the task file (and the cost
+        # model)
+        cores = [p for p in proc_time["mf"] if not p.startswith("acc_")]
+
+        def core_cycles(kernel, scale=None):
+            if scale is None:
+                return {c: proc_time[kernel][c][prbs] for c in cores}
+            return {c: proc_time[kernel][c][prbs] * scale for c in cores}
+
         # calculate clock cycles for each task type
-        armA7 = "ARM_CORTEX_A7"
-        armA15 = "ARM_CORTEX_A15"
         fft_acc = "acc:fft,ifftm,iffta"
 
-        pcs_input = {
-            "ARM_CORTEX_A7": 0,
-            "ARM_CORTEX_A15": 0,
-        }
+        pcs_input = dict.fromkeys(cores, 0)
         pcs_mf = {
-            armA7: proc_time["mf"][armA7][prbs],
-            armA15: proc_time["mf"][armA15][prbs],
+            **core_cycles("mf"),
             "acc:mf": proc_time["mf"]["acc_mf"][prbs],
         }
         pcs_fft = {
-            armA7: proc_time["fft"][armA7][prbs],
-            armA15: proc_time["fft"][armA15][prbs],
+            **core_cycles("fft"),
             fft_acc: proc_time["fft"]["acc_fft"][prbs],
         }
         pcs_ifftm = {
-            armA7: proc_time["fft"][armA7][prbs],
-            armA15: proc_time["fft"][armA15][prbs],
+            **core_cycles("fft"),
             fft_acc: proc_time["fft"]["acc_fft"][prbs],
         }
         pcs_iffta = {
-            armA7: proc_time["fft"][armA7][prbs],
-            armA15: proc_time["fft"][armA15][prbs],
+            **core_cycles("fft"),
             fft_acc: proc_time["fft"]["acc_fft"][prbs],
         }
         pcs_wind = {
-            armA7: proc_time["wind"][armA7][prbs],
-            armA15: proc_time["wind"][armA15][prbs],
+            **core_cycles("wind"),
             "acc:wind": proc_time["wind"]["acc_wind"][prbs],
         }
         pcs_comb = {
-            armA7: proc_time["comb"][armA7][prbs] * (ntrace.layers / 4),
-            armA15: proc_time["comb"][armA15][prbs] * (ntrace.layers / 4),
+            **core_cycles("comb", ntrace.layers / 4),
             "acc:comb": proc_time["comb"]["acc_comb"][prbs]
             * (ntrace.layers / 4)
             / 12,
         }
         pcs_ant = {
-            armA7: proc_time["ant"][armA7][prbs],
-            armA15: proc_time["ant"][armA15][prbs],
+            **core_cycles("ant"),
             "acc:ant": proc_time["ant"]["acc_ant"][prbs],
         }
         pcs_demap = {
-            armA7: proc_time["demap"][armA7][mod][prbs] * (ntrace.layers / 4),
-            armA15: proc_time["demap"][armA15][mod][prbs] * (ntrace.layers / 4),
+            **{
+                c: proc_time["demap"][c][mod][prbs] * (ntrace.layers / 4)
+                for c in cores
+            },
             f"acc:demap{ntrace.modulation_scheme}": proc_time["demap"][
                 "acc_demap"
             ][mod][prbs]
@@ -237,7 +236,13 @@ class FivegTrace(DataflowTrace):
 
     @staticmethod
     def from_hydra(
-        task_file, prbs, modulation_scheme, layers, antennas, **kwargs
+        task_file,
+        prbs,
+        modulation_scheme,
+        layers,
+        antennas,
+        cost_model=None,
+        **kwargs,
     ):
         # a little hacky, but it does the trick to instantiate the graph
         # directly from hydra.
@@ -249,6 +254,8 @@ class FivegTrace(DataflowTrace):
         ntrace.modulation_scheme = modulation_scheme
         ntrace.layers = layers
 
-        proc_time = get_task_time(hydra.utils.to_absolute_path(task_file))
+        proc_time = get_task_costs(
+            hydra.utils.to_absolute_path(task_file), cost_model
+        )
 
         return FivegTrace(ntrace, proc_time, antennas)
@@ -0,0 +1,99 @@
+# Copyright (C) 2021 TU Dresden
+# Licensed under the ISC license (see LICENSE.txt)
+#
+# Authors: Christian Menard
+
+import glob
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+
+from omegaconf import OmegaConf
+
+
+def config_hash(cfg, keys=None, files=()):
+    """Compute a stable hash of a configuration.
+
+    Args:
+        cfg (DictConfig): the configuration
+        keys (list of str): restrict the hash to these keys of the
+            configuration. All keys are used if None.
+        files (list of str): paths of files whose contents are added to the
+            hash
+
+    Returns:
+        str: a hex digest of the resolved configuration
+    """
+    if keys is not None:
+        cfg = OmegaConf.masked_copy(cfg, keys)
+    container = OmegaConf.to_container(cfg, resolve=True)
+    h = hashlib.sha256()
+    h.update(json.dumps(container, sort_keys=True, default=str).encode())
+    for path in files:
+        with open(path, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def package_sources():
+    """Get the paths of all Python sources of fivegsim.
+
+    Adding the sources to a cache key invalidates the cache whenever the code
+    changes, which the package version does not reflect in a development
+    checkout.
+
+    Returns:
+        list of str: the paths in a stable order
+    """
+    package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return sorted(
+        glob.glob(os.path.join(package_dir, "**", "*.py"), recursive=True)
+    )
+
+
+def package_version(name):
+    """Get the version of an installed package.
+
+    Returns:
+        str: the version or "unknown" if it cannot be determined
+    """
+    try:
+        from importlib.metadata import version
+
+        return version(name)
+    except Exception:  # Python < 3.8 or the package is not installed
+        return "unknown"
+
+
+def atomic_pickle_dump(obj, path):
+    """Pickle an object to a file atomically.
+
+    The object is first written to a temporary file in the same directory,
+    which is then moved to the destination. Concurrent readers thus either see
+    no file or the complete file. If several processes write the same path
+    concurrently, the last one wins.
+    """
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def pickle_load(path):
+    """Load a pickled object from a file.
+
+    Returns:
+        The loaded object or None if the file does not exist or is corrupted.
+    """
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        return None
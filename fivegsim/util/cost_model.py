@@ -0,0 +1,80 @@
+# Copyright (C) 2021 TU Dresden
+# Licensed under the ISC license (see LICENSE.txt)
+#
+# Authors: Christian Menard
+
+"""Derive the execution costs of processor types without measured traces.
+
+The task file only contains cycle counts for the processor types that were
+profiled. A cost model declares additional processor types, each derived from
+a measured reference type and the IPC (instructions per cycle) of the new
+type relative to the reference type. The relative IPC can be declared per
+kernel and defaults to ``default_ipc``. The cycles of the new type are the
+cycles of the reference type divided by the relative IPC. As the cycles are
+converted to time with the frequency of the processor, frequency scaling is
+covered by the platform configuration.
+
+Example config::
+
+    cost_model:
+      ARM_CORTEX_A55:
+        reference: ARM_CORTEX_A7
+        default_ipc: 1.2
+        ipc:
+          fft: 1.4
+"""
+
+from fivegsim.util.proc_tgff_reader import get_task_time
+
+
+def _scale(cycles, factor):
+    if isinstance(cycles, dict):
+        return {key: _scale(value, factor) for key, value in cycles.items()}
+    return cycles * factor
+
+
+def apply_cost_model(proc_time, cost_model):
+    """Add the processor types of a cost model to the task execution times.
+
+    Args:
+        proc_time (dict): the task execution times as returned by
+            :func:`get_task_time`
+        cost_model (dict): a dict mapping new processor types to their model
+
+    Returns:
+        dict: a copy of proc_time extended by the new processor types
+    """
+    proc_time = {kernel: dict(procs) for kernel, procs in proc_time.items()}
+    for proc, model in cost_model.items():
+        reference = model["reference"]
+        ipc = model.get("ipc") or {}
+        default_ipc = model.get("default_ipc", 1.0)
+        for kernel, procs in proc_time.items():
+            if proc in procs:
+                raise ValueError(
+                    f"The processor type {proc} has measured costs for the "
+                    f"kernel {kernel}"
+                )
+            if reference not in procs:
+                raise ValueError(
+                    f"The reference type {reference} has no costs for the "
+                    f"kernel {kernel}"
+                )
+            procs[proc] = _scale(
+                procs[reference], 1 / ipc.get(kernel, default_ipc)
+            )
+    return proc_time
+
+
+def get_task_costs(task_file, cost_model=None):
+    """Read the task execution times and apply a cost model.
+
+    Args:
+        task_file (str): path to the task file
+        cost_model (dict): an optional cost model (see
+            :func:`apply_cost_model`)
+    """
+    proc_time = get_task_time(task_file)
+    if cost_model:
+        proc_time = apply_cost_model(proc_time, cost_model)
+    return proc_time
@@ -0,0 +1,103 @@
+# Copyright (C) 2021 TU Dresden
+# Licensed under the ISC license (see LICENSE.txt)
+#
+# Authors: Christian Menard
+
+import logging
+
+import pytest
+
+
+class FakeProcessor:
+    """A processor that needs a fixed number of ticks per cycle."""
+
+    def __init__(
+        self,
+        name,
+        type,
+        ticks_per_cycle=1000,
+        static_power=0.0,
+        dynamic_power=1.0,
+    ):
+        self.name = name
+        self.type = type
+        self.ticks_per_cycle = ticks_per_cycle
+        self._static_power = static_power
+        self._dynamic_power = dynamic_power
+
+    def ticks(self, cycles):
+        return cycles * self.ticks_per_cycle
+
+    def static_power(self):
+        return self._static_power
+
+    def dynamic_power(self):
+        return self._dynamic_power
+
+    def __repr__(self):
+        return self.name
+
+
+class FakePolicy:
+    scheduling_cycles = 10
+
+
+class FakeScheduler:
+    def __init__(self, processors):
+        self.processors = processors
+        self.policy = FakePolicy()
+
+
+class FakePlatform:
+    """A platform with a single scheduler for all processors."""
+
+    def __init__(self, processors):
+        self._processors = processors
+
+    def processors(self):
+        return self._processors
+
+    def schedulers(self):
+        return [FakeScheduler(self._processors)]
+
+
+@pytest.fixture
+def make_processor():
+    """Create fake processors."""
+    return FakeProcessor
+
+
+@pytest.fixture
+def make_load_balancer():
+    """Create load balancers that only know about the given processors."""
+    from fivegsim.simulate.load_balancer import PhybenchLoadBalancer
+
+    def make(processors):
+        # FIXME: bypasses the constructor, which requires a full system
+        lb = PhybenchLoadBalancer.__new__(PhybenchLoadBalancer)
+        lb._log = logging.getLogger(__name__)
+        lb._cores = [pe for pe in processors if not pe.type.startswith("acc")]
+        lb._accelerator_pools = {}
+        for pe in processors:
+            if pe.type.startswith("acc:"):
+                for kernel in pe.type[4:].split(","):
+                    lb._accelerator_pools.setdefault(kernel, []).append(pe)
+        lb._process_cycles = {}
+        return lb
+
+    return make
+
+
+@pytest.fixture
+def make_mapper():
+    """Create FiveG mappers for a platform with the given processors."""
+    from fivegsim.mapper.fiveg import FiveGMapper
+
+    def make(processors):
+        # FIXME: bypasses the constructor, which requires a full platform
+        mapper = FiveGMapper.__new__(FiveGMapper)
+        mapper.platform = FakePlatform(processors)
+        mapper.native_pareto = False
+        return mapper
+
+    return make
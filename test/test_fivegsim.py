@@ -3,9 +3,12 @@
 #
 # Authors: Robert Khasanov, Christian Menard
 
+import csv
+import math
 from pathlib import Path
 import pytest
 import subprocess
+import time
 
 
 @pytest.mark.parametrize(
@@ -65,3 +68,484 @@ def test_fivegsim(
             found_lines |= 0x8
 
     assert found_lines == 0xF
+
+
+def _parse_summary(stdout):
+    summary = {}
+    for line in stdout.split("\n"):
+        if line.startswith("Total applications: "):
+            summary["total"] = int(line[20:])
+        if line.startswith("Total rejected: "):
+            summary["rejected"] = int(line[16:])
+        if line.startswith("Missed deadline: "):
+            summary["missed"] = int(line[17:])
+    return summary
+
+
+@pytest.mark.parametrize(
+    "trace,platform,options",
+    [
+        (
+            "lte_trace_2.csv",
+            "odroid",
+            ["load_balancer=true", "load_balancer_placement=least_loaded"],
+        ),
+        (
+            "lte_trace_2.csv",
+            "odroid_acc",
+            ["load_balancer=true", "load_balancer_placement=least_loaded"],
+        ),
+        (
+            "lte_trace_2.csv",
+            "odroid_acc",
+            ["load_balancer=true", "load_balancer_acc_affinity=true"],
+        ),
+        (
+            "lte_trace_1.csv",
+            "odroid_acc",
+            ["load_balancer=true", "load_balancer_steal=chain"],
+        ),
+        (
+            "lte_trace_1.csv",
+            "odroid_acc",
+            [
+                "mapper=fiveg",
+                "mapper.native_pareto=true",
+                "tetris_runtime=true",
+            ],
+        ),
+        ("lte_trace_1.csv", "odroid_acc", ["mapper=fiveg"]),
+        ("lte_trace_1.csv", "odroid", ["priority_order=criticality"]),
+        (
+            "lte_trace_1.csv",
+            "odroid",
+            ["load_balancer=true", "priority_order=deadline"],
+        ),
+        ("lte_trace_1.csv", "odroid", ["admission_control=true"]),
+        ("lte_trace_1.csv", "manycore_acc", ["load_balancer=true"]),
+        (
+            "lte_trace_1.csv",
+            "manycore_acc",
+            [
+                "platform.cluster_processors.1.type=ARM_CORTEX_A55",
+                "cost_model={ARM_CORTEX_A55: {reference: ARM_CORTEX_A7, "
+                "default_ipc: 1.2}}",
+            ],
+        ),
+        (
+            "lte_trace_1.csv",
+            "odroid_acc",
+            ["load_balancer=true", "admission_control=true"],
+        ),
+        ("lte_trace_2.csv", "odroid", ["analytical=true"]),
+        (
+            "lte_trace_1.csv",
+            "odroid_acc",
+            ["analytical=true", "admission_control=true"],
+        ),
+        ("lte_trace_1.csv", "odroid", ["hybrid=true"]),
+        (
+            "lte_trace_2.csv",
+            "odroid_acc",
+            ["hybrid=true", "hybrid_max_utilization=0.8"],
+        ),
+    ],
+)
+def test_fivegsim_options(tmpdir, trace, platform, options):
+    trace_file = Path(__file__).parent.resolve().joinpath(trace)
+
+    cmd = ["fivegsim", f"trace_file={trace_file}", f"platform={platform}"]
+    cmd.extend(options)
+
+    res = subprocess.run(cmd, cwd=tmpdir, check=True, stdout=subprocess.PIPE)
+
+    summary = _parse_summary(res.stdout.decode())
+    assert summary["total"] == 18
+    assert Path(tmpdir).joinpath("missrate.csv").is_file()
+
+
+def _read_missrate(path):
+    with open(path) as file:
+        return next(csv.DictReader(file))
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        ["priority_order=criticality"],
+        ["scheduler_policy=priority"],
+        ["scheduler_policy=priority_deadline", "load_balancer=true"],
+    ],
+)
+def test_priority_order(tmpdir, options):
+    trace_file = Path(__file__).parent.resolve().joinpath("lte_trace_2.csv")
+
+    # lte_trace_2 overloads the platform, thus deadlines are missed
+    cmd = ["fivegsim", f"trace_file={trace_file}", "platform=odroid"]
+    cmd.extend(options)
+    subprocess.run(cmd, cwd=tmpdir, check=True, stdout=subprocess.PIPE)
+    missrate = _read_missrate(Path(tmpdir).joinpath("missrate.csv"))
+    assert int(missrate["Missed_deadline"]) > 0
+
+    # the columns of all criticality levels are written
+    missed = 0
+    for cri in [0, 1, 2]:
+        cri_missed = int(missrate[f"Missed_deadline_cri{cri}"])
+        cri_total = int(missrate[f"Total_apps_cri{cri}"])
+        rate = float(missrate[f"Miss_rate_cri{cri}"])
+        if cri_total > 0:
+            assert rate == pytest.approx(cri_missed / cri_total)
+        else:
+            assert math.isnan(rate)
+        missed += cri_missed
+    assert missed == int(missrate["Missed_deadline"])
+
+
+def test_manycore_construction_time(tmpdir):
+    # the largest tested configuration: 64 clusters with 4 cores each and
+    # accelerator pools for fft and demapping
+    cmd = [
+        "fivegsim",
+        "benchmark_platform",
+        "platform=manycore_acc",
+        "platform.num_clusters=64",
+        "platform.accelerators.demap4.num=4",
+        "benchmark_platform.repetitions=1",
+        f"platform_cache_dir={Path(tmpdir).joinpath('cache')}",
+    ]
+    res = subprocess.run(cmd, cwd=tmpdir, check=True, stdout=subprocess.PIPE)
+
+    times = {}
+    for line in res.stdout.decode().split("\n"):
+        if line.endswith(" ms") and "platform construction: " in line:
+            label, time = line.split(": ")
+            times[label] = float(time[:-3])
+    assert set(times) == {
+        "Uncached platform construction",
+        "Cached platform construction",
+    }
+    assert times["Uncached platform construction"] < 60000
+    assert (
+        times["Cached platform construction"]
+        < times["Uncached platform construction"]
+    )
+
+
+def test_pareto_cache(tmpdir):
+    trace_file = Path(__file__).parent.resolve().joinpath("lte_trace_2.csv")
+    cache_dir = Path(tmpdir).joinpath("cache")
+
+    cmd = [
+        "fivegsim",
+        f"trace_file={trace_file}",
+        "platform=odroid",
+        "mapper=fiveg",
+        "tetris_runtime=true",
+        "resource_manager.schedule_reuse=true",
+        "pareto_time_scale=1.09",
+        "pareto_time_offset=0.10",
+        f"pareto_cache_dir={cache_dir}",
+    ]
+
+    # the first run populates the cache, the second one uses it
+    for run in ["cold", "warm"]:
+        run_dir = Path(tmpdir).joinpath(run)
+        run_dir.mkdir()
+        res = subprocess.run(
+            cmd, cwd=run_dir, check=True, stdout=subprocess.PIPE
+        )
+        summary = _parse_summary(res.stdout.decode())
+        assert summary == {"total": 18, "rejected": 7, "missed": 0}
+
+    assert len(list(cache_dir.glob("*/*/*.pickle"))) > 0
+
+
+def test_result_cache(tmpdir):
+    trace_file = Path(__file__).parent.resolve().joinpath("lte_trace_1.csv")
+    cache_dir = Path(tmpdir).joinpath("cache")
+
+    cmd = [
+        "fivegsim",
+        f"trace_file={trace_file}",
+        "platform=odroid_acc",
+        "load_balancer=true",
+        f"result_cache_dir={cache_dir}",
+    ]
+
+    # the first run populates the cache, the second one uses it
+    for run in ["cold", "warm"]:
+        run_dir = Path(tmpdir).joinpath(run)
+        run_dir.mkdir()
+        res = subprocess.run(
+            cmd, cwd=run_dir, check=True, stdout=subprocess.PIPE
+        )
+        summary = _parse_summary(res.stdout.decode())
+        assert summary == {"total": 18, "rejected": 0, "missed": 2}
+        assert run_dir.joinpath("missrate.csv").is_file()
+        assert run_dir.joinpath("stats.csv").is_file()
+
+    assert len(list(cache_dir.glob("*/*.pickle"))) == 1
+
+
+def test_results_db(tmpdir):
+    from fivegsim.plugin.results_db import load_applications, load_runs
+
+    trace_file = Path(__file__).parent.resolve().joinpath("lte_trace_1.csv")
+    db_path = Path(tmpdir).joinpath("results.db")
+
+    for load_balancer in ["true", "false"]:
+        run_dir = Path(tmpdir).joinpath(load_balancer)
+        run_dir.mkdir()
+        subprocess.run(
+            [
+                "fivegsim",
+                f"trace_file={trace_file}",
+                f"load_balancer={load_balancer}",
+                f"results_db={db_path}",
+            ],
+            cwd=run_dir,
+            check=True,
+        )
+
+    runs = load_runs(db_path, params=["load_balancer"])
+    assert sorted(runs["load_balancer"]) == ["False", "True"]
+    assert list(runs["total_apps"]) == [18, 18]
+    assert len(load_applications(db_path, where={"load_balancer": True})) == 18
+
+
+def test_analytical(tmpdir):
+    trace_files = [
+        str(Path(__file__).parent.resolve().joinpath(f"lte_trace_{i}.csv"))
+        for i in [1, 2]
+    ]
+
+    subprocess.run(
+        [
+            "fivegsim",
+            "validate_analytical",
+            f"validate_analytical.trace_files=[{','.join(trace_files)}]",
+        ],
+        cwd=tmpdir,
+        check=True,
+    )
+
+    with open(Path(tmpdir).joinpath("analytical_accuracy.csv")) as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 2
+    assert rows[0]["Total_apps"] == "18"
+    for row in rows:
+        assert 0 <= float(row["Miss_agreement"]) <= 1
+        assert float(row["Analytical_time"]) < float(row["Simulation_time"])
+
+
+def test_analytical_application_order(tmpdir):
+    from fivegsim.plugin.results_db import load_applications
+
+    trace_file = Path(__file__).parent.resolve().joinpath("lte_trace_1.csv")
+    db_path = Path(tmpdir).joinpath("results.db")
+
+    for analytical in ["false", "true"]:
+        run_dir = Path(tmpdir).joinpath(analytical)
+        run_dir.mkdir()
+        subprocess.run(
+            [
+                "fivegsim",
+                f"trace_file={trace_file}",
+                f"analytical={analytical}",
+                f"results_db={db_path}",
+            ],
+            cwd=run_dir,
+            check=True,
+        )
+
+    # the estimate records the applications in the same order as the
+    # simulation
+    simulated = load_applications(db_path, where={"analytical": False})
+    estimated = load_applications(db_path, where={"analytical": True})
+    assert len(simulated) == 18
+    assert list(estimated["name"]) == list(simulated["name"])
+    assert list(estimated["arrival"]) == list(simulated["arrival"])
+
+
+def test_platform_cache(tmpdir):
+    trace_file = Path(__file__).parent.resolve().joinpath("lte_trace_1.csv")
+    cache_dir = Path(tmpdir).joinpath("cache")
+
+    cmd = [
+        "fivegsim",
+        f"trace_file={trace_file}",
+        "platform=odroid",
+        f"platform_cache_dir={cache_dir}",
+    ]
+
+    # the first run populates the cache, the second one uses it
+    for run in ["cold", "warm"]:
+        run_dir = Path(tmpdir).joinpath(run)
+        run_dir.mkdir()
+        res = subprocess.run(
+            cmd, cwd=run_dir, check=True, stdout=subprocess.PIPE
+        )
+        summary = _parse_summary(res.stdout.decode())
+        assert summary == {"total": 18, "rejected": 0, "missed": 2}
+
+    assert len(list(cache_dir.glob("*/*.pickle"))) == 1
+
+
+def test_provision_accelerators(tmpdir):
+    trace_file = Path(__file__).parent.resolve().joinpath("lte_trace_2.csv")
+
+    subprocess.run(
+        [
+            "fivegsim",
+            "provision_accelerators",
+            f"trace_file={trace_file}",
+            "load_balancer=true",
+            "provision_accelerators.target_miss_rate=0.1",
+            "provision_accelerators.accelerators=[fft,mf]",
+            "provision_accelerators.max_per_accelerator=2",
+            "provision_accelerators.jobs=2",
+        ],
+        cwd=tmpdir,
+        check=True,
+    )
+
+    with open(Path(tmpdir).joinpath("provisioning.csv")) as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) > 1
+    assert any(row["pareto"] == "True" for row in rows)
+
+
+def _candidate(static_power, miss_rate, applications=18, aborted=False):
+    return {
+        "static_power": static_power,
+        "miss_rate": miss_rate,
+        "applications": applications,
+        "aborted": aborted,
+    }
+
+
+def test_provisioning_candidates():
+    from fivegsim.tasks.provision_accelerators import _pareto_set, _rank
+
+    complete = _candidate(2.0, 0.2)
+    cheap = _candidate(1.0, 0.3)
+    # aborted candidates only have a lower bound of their miss rate
+    far = _candidate(1.5, 0.1, applications=12, aborted=True)
+    near = _candidate(1.2, 0.1, applications=6, aborted=True)
+    dominated = _candidate(2.5, 0.2, applications=9, aborted=True)
+
+    # aborted candidates are ranked by how far they got into the trace
+    ranked = sorted([near, far, cheap, complete], key=_rank)
+    assert ranked == [complete, cheap, far, near]
+
+    pareto = _pareto_set([complete, cheap, far, near, dominated])
+    assert pareto == [complete, cheap, far, near]
+
+
+def test_sweep(tmpdir):
+    trace_file = Path(__file__).parent.resolve().joinpath("lte_trace_1.csv")
+
+    subprocess.run(
+        [
+            "fivegsim",
+            "sweep",
+            f"trace_file={trace_file}",
+            "platform=odroid_acc",
+            "+sweep.grid.load_balancer=[true,false]",
+            "+sweep.grid.platform.num_fft_acc=[1,2]",
+            "sweep.jobs=2",
+        ],
+        cwd=tmpdir,
+        check=True,
+    )
+
+    with open(Path(tmpdir).joinpath("sweep.csv")) as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 4
+    assert all(row["Total_apps"] == "18" for row in rows)
+
+
+def _serve(spool_dir, trace_file, jobs, num_workers):
+    """Run a server until all jobs are finished and shut it down."""
+    incoming_dir = spool_dir.joinpath("incoming")
+    results_dir = spool_dir.joinpath("results")
+    server = subprocess.Popen(
+        [
+            "fivegsim",
+            "serve",
+            f"serve.spool_dir={spool_dir}",
+            f"serve.jobs={num_workers}",
+        ],
+        cwd=spool_dir.parent,
+    )
+    try:
+        for job, load_balancer in jobs.items():
+            job_file = incoming_dir.joinpath(f"{job}.tmp")
+            job_file.write_text(
+                f"trace_file: {trace_file}\nload_balancer: {load_balancer}\n"
+            )
+            job_file.rename(incoming_dir.joinpath(f"{job}.yaml"))
+
+        timeout = time.time() + 600
+        while time.time() < timeout and not all(
+            results_dir.joinpath(f"{job}.csv").is_file() for job in jobs
+        ):
+            time.sleep(0.5)
+    finally:
+        spool_dir.joinpath("shutdown").touch()
+        server.wait(timeout=600)
+    assert server.returncode == 0
+
+
+def test_serve(tmpdir):
+    trace_file = Path(__file__).parent.resolve().joinpath("lte_trace_1.csv")
+    spool_dir = Path(tmpdir).joinpath("spool")
+    results_dir = spool_dir.joinpath("results")
+    spool_dir.joinpath("incoming").mkdir(parents=True)
+    # a job left behind by a server that terminated unexpectedly
+    orphaned_dir = spool_dir.joinpath("running", "server-dead")
+    orphaned_dir.mkdir(parents=True)
+    orphaned_dir.joinpath("lock").touch()
+    orphaned_dir.joinpath("orphaned.yaml").write_text("load_balancer: true\n")
+
+    jobs = {"static": "false", "load_balancer": "true"}
+    _serve(spool_dir, trace_file, jobs, 2)
+    assert results_dir.joinpath("orphaned.error").is_file()
+    assert not orphaned_dir.exists()
+
+    # the shutdown file of the previous server does not stop the next server,
+    # which runs each job twice in the same worker process
+    repeated_jobs = {
+        f"{job}_{i}": load_balancer
+        for job, load_balancer in jobs.items()
+        for i in range(2)
+    }
+    _serve(spool_dir, trace_file, repeated_jobs, 1)
+
+    assert list(spool_dir.joinpath("running").iterdir()) == []
+    for job in list(jobs) + list(repeated_jobs):
+        with open(results_dir.joinpath(f"{job}.csv")) as f:
+            rows = list(csv.DictReader(f))
+        assert rows[0]["Total_apps"] == "18"
+        assert rows[0]["Missed_deadline"] == "2"
+
+
+def test_precompute_pareto(tmpdir):
+    trace_file = Path(__file__).parent.resolve().joinpath("lte_trace_1.csv")
+    cache_dir = Path(tmpdir).joinpath("cache")
+
+    subprocess.run(
+        [
+            "fivegsim",
+            "precompute_pareto",
+            f"trace_file={trace_file}",
+            "platform=odroid_acc",
+            f"pareto_cache_dir={cache_dir}",
+            "precompute_pareto.jobs=2",
+        ],
+        cwd=tmpdir,
+        check=True,
+    )
+
+    invariants = {f.stem for f in cache_dir.glob("*/*/*.pickle")}
+    assert "fiveg_prbs7_mod2_lay4" in invariants
@@ -0,0 +1,272 @@
+# Copyright (C) 2021 TU Dresden
+# Licensed under the ISC license (see LICENSE.txt)
+#
+# Authors: Christian Menard
+
+from pathlib import Path
+
+from mocasin.simulate.process import ProcessState
+import pytest
+import simpy
+
+from fivegsim.graph import FivegGraph
+from fivegsim.trace import FivegTrace
+
+task_file = (
+    Path(__file__).parent.parent.resolve() / "fivegsim/files/proc_file.csv"
+)
+
+
+def _graph_and_cycles(mod=4):
+    graph = FivegGraph.from_hydra(0, 50, mod, 4, 4)
+    trace = FivegTrace.from_hydra(str(task_file), 50, mod, 4, 4)
+    return graph, graph.process_cycles(trace)
+
+
+def _instance_ticks(graph, cycles, pe):
+    ticks = []
+    for phase in graph.structure.values():
+        for i in range(phase["num_instances"]):
+            ticks.append(
+                sum(
+                    pe.ticks(cycles[f"{subkernel}{i}"][pe.type])
+                    for subkernel in phase["subkernels"]
+                )
+            )
+    return ticks
+
+
+def test_least_loaded_placement(make_processor, make_load_balancer):
+    cores = [make_processor(f"core{i}", "ARM_CORTEX_A7") for i in range(4)]
+    unknown = make_processor("core4", "RISCV")
+    lb = make_load_balancer(cores + [unknown])
+    graph, cycles = _graph_and_cycles()
+
+    # the first core is busy for longer than the entire application takes
+    backlog = dict.fromkeys(cores + [unknown], 0)
+    backlog[cores[0]] = 1000000000000
+    placement = lb._least_loaded_placement(graph, cycles, backlog)
+
+    assert set(placement) == {p.name for p in graph.processes()}
+    # the work is spread across all idle cores, but neither the loaded core
+    # nor the core without cost information get any work
+    assert set(placement.values()) == set(cores[1:])
+    assert backlog[cores[0]] == 1000000000000
+    assert backlog[unknown] == 0
+    # each instance was placed on the least loaded core, thus the loads
+    # differ by at most the longest instance
+    loads = [backlog[pe] for pe in cores[1:]]
+    assert max(loads) - min(loads) <= max(
+        _instance_ticks(graph, cycles, cores[1])
+    )
+
+
+def test_assign_accelerators(make_processor, make_load_balancer):
+    cores = [make_processor(f"core{i}", "ARM_CORTEX_A7") for i in range(2)]
+    accelerators = [
+        make_processor("mf_acc", "acc:mf", 4000),
+        make_processor("demap2_acc", "acc:demap2", 4000),
+        make_processor("demap4_acc", "acc:demap4", 4000),
+    ]
+    lb = make_load_balancer(cores + accelerators)
+    graph, cycles = _graph_and_cycles(mod=4)
+    lb._process_cycles[graph.name] = cycles
+
+    # map the entire application to a single core
+    placement = {name: cores[0] for name in cycles}
+    backlog = dict.fromkeys(cores + accelerators, 0)
+    backlog[cores[0]] = sum(
+        cores[0].ticks(c[cores[0].type]) for c in cycles.values()
+    )
+    lb._assign_accelerators(graph, placement, backlog)
+
+    moved = {name: pe for name, pe in placement.items() if pe is not cores[0]}
+    # each process moved to the accelerator pool matching its kernel name
+    assert {pe for pe in moved.values()} == {
+        accelerators[0],
+        accelerators[2],
+    }
+    for name, pe in moved.items():
+        assert name.rstrip("0123456789") in pe.type[4:].split(",")
+    # the pool of another modulation scheme does not get any work
+    assert backlog[accelerators[1]] == 0
+    assert sum(backlog.values()) < sum(
+        cores[0].ticks(c[cores[0].type]) for c in cycles.values()
+    )
+
+
+class FakeApplication:
+    def __init__(self, name):
+        self.name = name
+        self._process_mappings = {}
+
+
+class FakeProcess:
+    def __init__(self, name, app, state=None):
+        self.name = name
+        self.app = app
+        self.state = state
+        self._channels = {}
+
+    def check_state(self, state):
+        return self.state == state
+
+
+class FakeChannel:
+    def __init__(self, name, src, sink):
+        self.name = name
+        self._src = lambda: src
+        self._sinks = [lambda: sink]
+        self._primitive = None
+        src._channels[name] = lambda: self
+        sink._channels[name] = lambda: self
+
+
+class FakeScheduler:
+    def __init__(self, name, processor, ready_queue):
+        self.name = name
+        self._processor = processor
+        self._ready_queue = ready_queue
+
+    @property
+    def is_idle(self):
+        return not self._ready_queue
+
+
+class FakeSystem:
+    def __init__(self):
+        self.moves = []
+
+    def move_process(self, process, from_processor, to_processor):
+        self.moves.append((process.name, from_processor, to_processor))
+
+
+def _steal_setup(make_processor, make_load_balancer, steal_mode):
+    cores = [make_processor(f"core{i}", "ARM_CORTEX_A7") for i in range(2)]
+    app = FakeApplication("app")
+    names = ["mf0", "ifftm0", "wind0", "fft0"]
+    # the first process is ready, its successors were not started yet
+    processes = [FakeProcess(names[0], app, ProcessState.READY)] + [
+        FakeProcess(name, app, ProcessState.CREATED) for name in names[1:]
+    ]
+    for src, sink in zip(processes, processes[1:]):
+        FakeChannel(f"{src.name}_{sink.name}", src, sink)
+    # the chain is cut at fft0, which is mapped to the other core
+    for process in processes[:3]:
+        app._process_mappings[process] = cores[0]
+    app._process_mappings[processes[3]] = cores[1]
+
+    lb = make_load_balancer(cores)
+    lb.system = FakeSystem()
+    lb._steal_mode = steal_mode
+    lb._chains = {"app": {name: names[k + 1 :] for k, name in enumerate(names)}}
+    lb._primitives = {(a, b): "primitive" for a in cores for b in cores}
+    lb._schedulers = [
+        FakeScheduler("sched0", cores[0], [processes[0]]),
+        FakeScheduler("sched1", cores[1], []),
+    ]
+    return lb, cores, app, processes
+
+
+def test_steal_chain(make_processor, make_load_balancer):
+    lb, cores, app, processes = _steal_setup(
+        make_processor, make_load_balancer, "chain"
+    )
+    lb._steal_task(lb._schedulers[1])
+
+    # the ready process migrates together with its successors on the same
+    # core
+    assert lb.system.moves == [
+        ("mf0", cores[0], cores[1]),
+        ("ifftm0", cores[0], cores[1]),
+        ("wind0", cores[0], cores[1]),
+    ]
+    assert all(app._process_mappings[p] is cores[1] for p in processes)
+
+
+@pytest.mark.parametrize(
+    "state",
+    [ProcessState.BLOCKED, ProcessState.RUNNING, ProcessState.FINISHED],
+)
+def test_steal_chain_cut_at_unready_process(
+    make_processor, make_load_balancer, state
+):
+    lb, cores, app, processes = _steal_setup(
+        make_processor, make_load_balancer, "chain"
+    )
+    processes[1].state = ProcessState.READY
+    processes[2].state = state
+    lb._steal_task(lb._schedulers[1])
+
+    # only ready or created successors are migrated, the chain is cut at the
+    # first process in another state
+    assert [move[0] for move in lb.system.moves] == ["mf0", "ifftm0"]
+    assert app._process_mappings[processes[2]] is cores[0]
+
+
+def test_steal_process(make_processor, make_load_balancer):
+    lb, cores, app, processes = _steal_setup(
+        make_processor, make_load_balancer, "process"
+    )
+    lb._steal_task(lb._schedulers[1])
+
+    assert lb.system.moves == [("mf0", cores[0], cores[1])]
+    assert app._process_mappings[processes[1]] is cores[0]
+
+
+class CountingScheduler:
+    """A busy scheduler that counts how often the runtime checked it."""
+
+    def __init__(self, env):
+        self.name = "sched"
+        self.process_ready = env.event()
+        self.checks = 0
+
+    @property
+    def is_idle(self):
+        self.checks += 1
+        return False
+
+
+def _wake_up_setup(make_load_balancer):
+    lb = make_load_balancer([])
+    lb.env = simpy.Environment()
+    lb._wake_up = lb.env.event()
+    lb._request_shutdown = lb.env.event()
+    lb._ready_waits = {}
+    lb._finished_events = []
+    scheduler = CountingScheduler(lb.env)
+    lb._schedulers = [scheduler]
+    lb.env.process(lb.run())
+    return lb, scheduler
+
+
+def test_notifications_are_coalesced(make_load_balancer):
+    lb, scheduler = _wake_up_setup(make_load_balancer)
+
+    def notify():
+        for _ in range(3):
+            lb._notify()
+        yield lb.env.timeout(10)
+        lb._notify()
+
+    lb.env.process(notify())
+    lb.env.run(until=5)
+    # three notifications at the same time only wake up the runtime once
+    assert scheduler.checks == 1
+    lb.env.run(until=20)
+    assert scheduler.checks == 2
+
+
+def test_wait_for_ready_registers_single_callback(make_load_balancer):
+    lb, scheduler = _wake_up_setup(make_load_balancer)
+    lb.env.run(until=1)
+
+    for _ in range(3):
+        lb._wait_for_ready(scheduler)
+    assert len(scheduler.process_ready.callbacks) == 1
+
+    scheduler.process_ready.succeed()
+    lb.env.run(until=2)
+    # the ready event wakes up the runtime exactly once
+    assert scheduler.checks == 1
@@ -0,0 +1,273 @@
+# Copyright (C) 2021 TU Dresden
+# Licensed under the ISC license (see LICENSE.txt)
+#
+# Authors: Christian Menard
+
+from collections import Counter
+
+import pytest
+
+from fivegsim.graph import FivegGraph
+from fivegsim.mapper.fiveg import _core_counts
+
+_subkernels = ["mf", "ifftm", "wind", "fft"]
+
+
+class FakeTrace:
+    """A trace in which all kernels take the same cycles on a processor type."""
+
+    def __init__(self, graph, cycles):
+        self.cycles = {}
+        for phase in graph.structure.values():
+            for subkernel in phase["subkernels"]:
+                self.cycles[f"{subkernel}0"] = dict(cycles)
+
+    def accumulate_processor_cycles(self, process):
+        return self.cycles[process]
+
+
+def _phase1_setup(make_mapper, processors, cycles):
+    # 4 layers and 4 antennas yield 16 instances of phase1
+    graph = FivegGraph.from_hydra(0, 50, 4, 4, 4)
+    trace = FakeTrace(graph, cycles)
+    mapper = make_mapper(processors)
+    processes = {p.name: p for p in graph.processes()}
+    return mapper, graph, trace, processes
+
+
+def _cores(make_processor, num_a, num_b):
+    return [make_processor(f"a{i}", "A", 2) for i in range(num_a)] + [
+        make_processor(f"b{i}", "B", 3) for i in range(num_b)
+    ]
+
+
+def test_load_balancing(make_processor, make_mapper):
+    cores = _cores(make_processor, 1, 1)
+    mapper, graph, trace, processes = _phase1_setup(
+        make_mapper, cores, {"A": 10, "B": 10}
+    )
+
+    mapping_dict = {}
+    exec_time, dynamic_energy = mapper._map_phase(
+        graph, trace, mapping_dict, "phase1", cores, processes
+    )
+    # an instance takes 4 * (10 + 10) cycles including the scheduling
+    # overhead, i.e., 160 ticks on a0 and 240 ticks on b0. The instances are
+    # split 10:6, for which a0 finishes after 1600 and b0 after 1440 ticks.
+    assert exec_time == 1600
+    assert dynamic_energy == 1600 + 1440
+    for i in range(16):
+        pe = cores[0] if i < 10 else cores[1]
+        for subkernel in _subkernels:
+            assert mapping_dict[processes[f"{subkernel}{i}"]] is pe
+
+
+def test_load_balancing_ties(make_processor, make_mapper):
+    cores = _cores(make_processor, 3, 0)
+    mapper, graph, trace, processes = _phase1_setup(
+        make_mapper, cores, {"A": 10}
+    )
+
+    mapping_dict = {}
+    exec_time, _ = mapper._map_phase(
+        graph, trace, mapping_dict, "phase1", cores, processes
+    )
+    # ties are broken by the processor order, thus the first core gets the
+    # remaining instance
+    counts = Counter(mapping_dict[processes[f"mf{i}"]] for i in range(16))
+    assert counts == {cores[0]: 6, cores[1]: 5, cores[2]: 5}
+    assert exec_time == 6 * 160
+
+
+def _accelerators(make_processor, num, kernels, ticks_per_cycle=10):
+    return [
+        make_processor(f"acc_{kernels}{i}", f"acc:{kernels}", ticks_per_cycle)
+        for i in range(num)
+    ]
+
+
+def test_accelerator_remapping(make_processor, make_mapper):
+    cores = _cores(make_processor, 2, 0)
+    accelerators = _accelerators(make_processor, 1, "fft")
+    mapper, graph, trace, processes = _phase1_setup(
+        make_mapper, cores + accelerators, {"A": 10, "acc:fft": 10}
+    )
+
+    mapping_dict = {}
+    exec_time, dynamic_energy = mapper._map_phase(
+        graph, trace, mapping_dict, "phase1", cores + accelerators, processes
+    )
+    # Each core first executes 8 instances in 1280 ticks. The accelerator
+    # starts after mf, ifftm and wind (60 ticks). Moving an fft instance saves
+    # 20 ticks on a core and costs 100 ticks on the accelerator. Instances
+    # are moved from the most loaded core as long as the accelerator does not
+    # finish last: 6 from a0 (fft7 to fft2) and 5 from a1 (fft15 to fft11).
+    moved = {2, 3, 4, 5, 6, 7, 11, 12, 13, 14, 15}
+    for i in range(16):
+        pe = cores[0] if i < 8 else cores[1]
+        fft_pe = accelerators[0] if i in moved else pe
+        assert mapping_dict[processes[f"fft{i}"]] is fft_pe
+        for subkernel in ["mf", "ifftm", "wind"]:
+            assert mapping_dict[processes[f"{subkernel}{i}"]] is pe
+    assert exec_time == 1180
+    assert dynamic_energy == 1160 + 1180
+
+
+def test_accelerator_pools(make_processor, make_mapper):
+    cores = _cores(make_processor, 2, 0)
+    mf_accelerators = _accelerators(make_processor, 2, "mf", 1)
+    fft_accelerators = _accelerators(make_processor, 2, "fft,ifftm", 1)
+    processors = cores + mf_accelerators + fft_accelerators
+    mapper, graph, trace, processes = _phase1_setup(
+        make_mapper,
+        processors,
+        {"A": 10, "acc:mf": 10, "acc:fft,ifftm": 10},
+    )
+
+    mapping_dict = {}
+    mapper._map_phase(
+        graph, trace, mapping_dict, "phase1", processors, processes
+    )
+    # each kernel is only remapped to the pool that supports it
+    for subkernel, pool in [
+        ("mf", mf_accelerators),
+        ("ifftm", fft_accelerators),
+        ("wind", []),
+        ("fft", fft_accelerators),
+    ]:
+        pes = {mapping_dict[processes[f"{subkernel}{i}"]] for i in range(16)}
+        assert pes <= set(cores + pool)
+        if pool:
+            assert pes & set(pool)
+
+
+def test_accelerator_pools_with_shared_kernel(make_processor, make_mapper):
+    cores = _cores(make_processor, 2, 0)
+    fft_accelerators = _accelerators(make_processor, 1, "fft", 1)
+    shared_accelerators = _accelerators(make_processor, 1, "fft,ifftm", 1)
+    processors = cores + fft_accelerators + shared_accelerators
+    mapper, graph, trace, processes = _phase1_setup(
+        make_mapper,
+        processors,
+        {"A": 10, "acc:fft": 10, "acc:fft,ifftm": 10},
+    )
+
+    mapping_dict = {}
+    mapper._map_phase(
+        graph, trace, mapping_dict, "phase1", processors, processes
+    )
+    # fft is remapped to the first pool that supports it, ifftm to the
+    # second one
+    fft_pes = {mapping_dict[processes[f"fft{i}"]] for i in range(16)}
+    ifftm_pes = {mapping_dict[processes[f"ifftm{i}"]] for i in range(16)}
+    assert fft_pes <= set(cores + fft_accelerators)
+    assert ifftm_pes <= set(cores + shared_accelerators)
+    assert shared_accelerators[0] in ifftm_pes
+
+
+def test_accelerator_starts_after_base_time(make_processor, make_mapper):
+    cores = _cores(make_processor, 2, 0)
+    accelerators = _accelerators(make_processor, 1, "fft", 1)
+    mapper, graph, trace, processes = _phase1_setup(
+        make_mapper, cores + accelerators, {"A": 10, "acc:fft": 10}
+    )
+
+    base_time = Counter({cores[0]: 1000, cores[1]: 2000, accelerators[0]: 0})
+    mapping_dict = {}
+    mapper._map_phase(
+        graph,
+        trace,
+        mapping_dict,
+        "phase1",
+        cores + accelerators,
+        processes,
+        base_time,
+    )
+    # the accelerator cannot start before the first core is available and
+    # the subkernels before fft finished (3 * 20 ticks)
+    num_fft = sum(1 for pe in mapping_dict.values() if pe is accelerators[0])
+    assert num_fft > 0
+    assert base_time[accelerators[0]] == 1000 + 60 + num_fft * 10
+
+
+def test_idle_accelerator_is_not_loaded(make_processor, make_mapper):
+    cores = _cores(make_processor, 2, 0)
+    # an accelerator that is too slow to be worth using
+    accelerators = _accelerators(make_processor, 1, "fft", 1000000)
+    mapper, graph, trace, processes = _phase1_setup(
+        make_mapper, cores + accelerators, {"A": 10, "acc:fft": 10}
+    )
+
+    base_time = Counter(dict.fromkeys(cores + accelerators, 0))
+    mapping_dict = {}
+    mapper._map_phase(
+        graph,
+        trace,
+        mapping_dict,
+        "phase1",
+        cores + accelerators,
+        processes,
+        base_time,
+    )
+    assert accelerators[0] not in mapping_dict.values()
+    assert base_time[accelerators[0]] == 0
+    assert all(base_time[pe] > 0 for pe in cores)
+
+
+@pytest.mark.parametrize(
+    "num_cores,counts",
+    [(0, [0]), (1, [0, 1]), (4, [0, 1, 2, 4]), (6, [0, 1, 2, 4, 6])],
+)
+def test_core_counts(num_cores, counts):
+    assert _core_counts(num_cores) == counts
+
+
+def test_native_pareto_candidates(make_processor, make_mapper):
+    processors = (
+        _cores(make_processor, 64, 64)
+        + _accelerators(make_processor, 4, "fft")
+        + _accelerators(make_processor, 4, "mf")
+    )
+    graph = FivegGraph.from_hydra(0, 50, 4, 4, 4)
+    trace = FakeTrace(graph, {"A": 10, "B": 10, "acc:fft": 1, "acc:mf": 1})
+    mapper = make_mapper(processors)
+    mapper.native_pareto = True
+
+    balanced = []
+    balance = mapper._balance
+
+    def count_balance(graph, trace, processors, processes, load=None):
+        balanced.append(processors)
+        return balance(graph, trace, processors, processes, load)
+
+    # FIXME: accesses private members of the mapper
+    mapper._balance = count_balance
+    mapper._create_mapping = lambda *args: args[3:]
+    front = mapper.generate_pareto_front(graph, trace)
+
+    # 8 numbers of cores per type and 4 accelerator options, instead of
+    # 65 * 65 numbers of cores
+    assert len(balanced) == (8 * 8 - 1) * 4
+    assert {len(pes) for pes in balanced} >= {1, 128, 132, 136}
+    assert 0 < len(front) <= len(balanced)
+
+
+def test_joint_mappings_with_accelerator_pools(make_processor, make_mapper):
+    processors = (
+        _cores(make_processor, 2, 2)
+        + _accelerators(make_processor, 2, "fft,ifftm", 1)
+        + _accelerators(make_processor, 2, "mf", 1)
+    )
+    graphs = [FivegGraph.from_hydra(i, 50, 4, 4, 4) for i in range(3)]
+    for criticality, graph in enumerate(graphs):
+        graph.criticality = criticality
+    cycles = {"A": 10, "B": 10, "acc:fft,ifftm": 10, "acc:mf": 10}
+    traces = [FakeTrace(graph, cycles) for graph in graphs]
+    mapper = make_mapper(processors)
+    # FIXME: accesses a private member of the mapper
+    mapper._create_mapping = lambda *args: args[3]
+
+    mapping_dicts = mapper.generate_joint_mappings(graphs, traces)
+    assert len(mapping_dicts) == 3
+    used = {pe for d in mapping_dicts for pe in d.values()}
+    assert used == set(processors)
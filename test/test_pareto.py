@@ -0,0 +1,332 @@
+# Copyright (C) 2021 TU Dresden
+# Licensed under the ISC license (see LICENSE.txt)
+#
+# Authors: Christian Menard
+
+import random
+
+from mocasin.common.mapping import ProcessMappingInfo
+from omegaconf import OmegaConf
+import pytest
+
+from fivegsim.mapper.pareto import FiveGParetoFrontCache
+
+
+class FakeGraph:
+    def __init__(self, id, prbs=50, mod=4, layers=4, priority=0):
+        self.name = f"fiveg{id}"
+        self.prbs = prbs
+        self.mod = mod
+        self.layers = layers
+        self.priority = priority
+
+    def process_cycles(self, trace):
+        return trace.cycles
+
+
+class FakeMetadata:
+    def __init__(self, exec_time, energy):
+        self.exec_time = exec_time
+        self.energy = energy
+
+
+class FakeMapping:
+    def __init__(self, graph, exec_time, energy, process_info):
+        self.graph = graph
+        self.metadata = FakeMetadata(exec_time, energy)
+        self._process_info = process_info
+
+    def to_list(self):
+        return [info.affinity for info in self._process_info.values()]
+
+
+def _pareto_cache(**kwargs):
+    cfg = {
+        "pareto_metadata_simulate": False,
+        "pareto_time_scale": 1.0,
+        "pareto_time_offset": 0.0,
+        "pareto_epsilon": None,
+        "pareto_max_points": None,
+        "pareto_prb_interpolation": False,
+        "pareto_interpolation_max_error": 0.05,
+        "pareto_cache_dir": None,
+    }
+    cfg.update(kwargs)
+    return FiveGParetoFrontCache(None, OmegaConf.create(cfg))
+
+
+def test_mappings_are_reused_for_same_invariant(monkeypatch):
+    cache = _pareto_cache()
+    generated = []
+
+    def generate(graph, trace):
+        generated.append(graph)
+        return [
+            FakeMapping(
+                graph,
+                exec_time,
+                energy,
+                {"mf0": ProcessMappingInfo("sched", "core0", graph.priority)},
+            )
+            for exec_time, energy in [(1.0, 3.0), (2.0, 2.0)]
+        ]
+
+    monkeypatch.setattr(cache, "_generate_pareto_front", generate)
+
+    graph_a = FakeGraph(0, priority=0)
+    graph_b = FakeGraph(1, priority=2)
+    front_a = cache.get_pareto_front(graph_a, None)
+    front_b = cache.get_pareto_front(graph_b, None)
+
+    # the front of an invariant is only generated once
+    assert generated == [graph_a]
+    assert len(front_a) == len(front_b) == 2
+    for mapping_a, mapping_b in zip(front_a, front_b):
+        assert mapping_a.graph is graph_a
+        assert mapping_b.graph is graph_b
+        assert mapping_a._process_info["mf0"].priority == 0
+        assert mapping_b._process_info["mf0"].priority == 2
+        assert mapping_a._process_info["mf0"].affinity == "core0"
+        # modifying the metadata of a bound mapping does not affect others
+        assert mapping_a.metadata is not mapping_b.metadata
+        assert mapping_a.metadata.exec_time == mapping_b.metadata.exec_time
+
+    # a different invariant requires a new front
+    graph_c = FakeGraph(2, prbs=40)
+    cache.get_pareto_front(graph_c, None)
+    assert generated == [graph_a, graph_c]
+
+
+def _random_front(seed, size=50):
+    """Generate a random Pareto front in random order."""
+    rng = random.Random(seed)
+    times = sorted(rng.uniform(1.0, 10.0) for _ in range(size))
+    energies = sorted(
+        (rng.uniform(1.0, 10.0) for _ in range(size)), reverse=True
+    )
+    front = [
+        FakeMapping(None, time, energy, {})
+        for time, energy in zip(times, energies)
+    ]
+    rng.shuffle(front)
+    return front
+
+
+def _dominates(a, b):
+    return (
+        a.metadata.exec_time <= b.metadata.exec_time
+        and a.metadata.energy <= b.metadata.energy
+        and (
+            a.metadata.exec_time < b.metadata.exec_time
+            or a.metadata.energy < b.metadata.energy
+        )
+    )
+
+
+def _check_thinned(front, thinned):
+    # the thinned front is a sorted subset of the original front
+    assert all(any(m is n for n in front) for m in thinned)
+    assert thinned == sorted(thinned, key=lambda m: m.metadata.exec_time)
+    # and remains Pareto-optimal
+    assert not any(_dominates(a, b) for a in thinned for b in thinned)
+    # the fastest mapping is always kept
+    fastest = min(front, key=lambda m: m.metadata.exec_time)
+    assert thinned[0] is fastest
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("max_points", [1, 2, 3, 8, 49, 50, 100])
+def test_spread_pareto_front(seed, max_points):
+    front = _random_front(seed)
+    cache = _pareto_cache(pareto_max_points=max_points)
+    thinned = cache._thin_pareto_front(front)
+
+    _check_thinned(front, thinned)
+    assert len(thinned) == min(max_points, len(front))
+    if max_points > 1:
+        efficient = min(front, key=lambda m: m.metadata.energy)
+        assert thinned[-1] is efficient
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("epsilon", [0.0, 0.05, 0.5, 10.0])
+@pytest.mark.parametrize("max_points", [None, 4])
+def test_epsilon_pareto_front(seed, epsilon, max_points):
+    front = _random_front(seed)
+    cache = _pareto_cache(pareto_epsilon=epsilon, pareto_max_points=max_points)
+    thinned = cache._thin_pareto_front(front)
+
+    _check_thinned(front, thinned)
+    efficient = min(front, key=lambda m: m.metadata.energy)
+    assert thinned[-1] is efficient
+    if max_points is None:
+        # each dropped mapping is epsilon-dominated by a kept mapping
+        factor = 1.0 + epsilon
+        for mapping in front:
+            assert any(
+                kept.metadata.exec_time <= factor * mapping.metadata.exec_time
+                and kept.metadata.energy <= factor * mapping.metadata.energy
+                for kept in thinned
+            )
+        if epsilon == 0.0:
+            assert len(thinned) == len(front)
+    else:
+        assert len(thinned) <= max_points
+
+
+class FakeTrace:
+    def __init__(self, cycles):
+        self.cycles = cycles
+
+
+def _cycles(prbs, intercept):
+    """Cycle counts that grow linearly with the PRBs."""
+    return {
+        f"p{i}": {
+            "A": (i + 1) * prbs + intercept,
+            "B": (i + 2) * prbs + intercept,
+        }
+        for i in range(6)
+    }
+
+
+def _exact_metadata(mapping, cycles, scale, offset, sequential):
+    """A monotone and positively homogeneous model of time and energy.
+
+    The processes on each processor execute one after another. If
+    ``sequential`` is set, the first process runs before all others.
+    """
+    loads = {}
+    first = 0
+    for name, info in mapping._process_info.items():
+        pe = info.affinity
+        ticks = pe.ticks(cycles[name][pe.type])
+        if sequential and name == "p0":
+            first = ticks
+        else:
+            loads[pe] = loads.get(pe, 0) + ticks
+    time = first + max(loads.values())
+    dynamic_energy = sum(
+        pe.ticks(cycles[name][pe.type]) * pe.dynamic_power()
+        for name, pe in (
+            (name, info.affinity)
+            for name, info in mapping._process_info.items()
+        )
+    )
+    static_power = sum(
+        pe.static_power()
+        for pe in {info.affinity for info in mapping._process_info.values()}
+    )
+    return time * scale + offset, dynamic_energy + static_power * time
+
+
+def _mapping(graph, affinities, cycles, scale, offset, sequential):
+    mapping = FakeMapping(
+        graph,
+        0.0,
+        0.0,
+        {
+            f"p{i}": ProcessMappingInfo("sched", pe, graph.priority)
+            for i, pe in enumerate(affinities)
+        },
+    )
+    metadata = _exact_metadata(mapping, cycles, scale, offset, sequential)
+    mapping.metadata = FakeMetadata(*metadata)
+    return mapping
+
+
+def _interpolation_setup(
+    monkeypatch, make_processor, intercept, max_error, sequential=True
+):
+    scale, offset = 1.5, 100.0
+    cache = _pareto_cache(
+        pareto_time_scale=scale,
+        pareto_time_offset=offset,
+        pareto_prb_interpolation=True,
+        pareto_interpolation_max_error=max_error,
+    )
+    monkeypatch.setattr(
+        cache,
+        "_create_trace",
+        lambda prbs, mod, layers: FakeTrace(_cycles(prbs, intercept)),
+    )
+    generated = []
+    monkeypatch.setattr(
+        cache,
+        "_generate_pareto_front",
+        lambda graph, trace: generated.append(graph) or [],
+    )
+
+    # the cached base front at 40 PRBs
+    core0 = make_processor("core0", "A", 2, 0.5, 1.0)
+    core1 = make_processor("core1", "B", 3, 0.25, 2.0)
+    base_graph = FakeGraph(0, prbs=40)
+    base_cycles = _cycles(40, intercept)
+    base_invariant = cache._get_graph_invariant(base_graph)
+    cache._mappings[base_invariant] = [
+        _mapping(base_graph, affinities, base_cycles, scale, offset, sequential)
+        for affinities in [
+            [core0] * 6,
+            [core0, core0, core1, core0, core1, core1],
+            [core1] * 6,
+        ]
+    ]
+    cache._cache[base_invariant] = cache._to_lists(
+        cache._mappings[base_invariant]
+    )
+    return cache, generated, scale, offset
+
+
+@pytest.mark.parametrize(
+    "intercept,sequential", [(0, True), (50, True), (50, False)]
+)
+def test_interpolated_pareto_front(
+    monkeypatch, make_processor, intercept, sequential
+):
+    cache, generated, scale, offset = _interpolation_setup(
+        monkeypatch,
+        make_processor,
+        intercept,
+        max_error=1.0,
+        sequential=sequential,
+    )
+    graph = FakeGraph(1, prbs=44)
+    cycles = _cycles(44, intercept)
+    front = cache.get_pareto_front(graph, FakeTrace(cycles))
+
+    assert generated == []
+    assert len(front) == 3
+    for mapping in front:
+        assert mapping.graph is graph
+        exec_time, energy = _exact_metadata(
+            mapping, cycles, scale, offset, sequential
+        )
+        time_error = abs(
+            (mapping.metadata.exec_time - offset) / (exec_time - offset) - 1.0
+        )
+        energy_error = abs(mapping.metadata.energy / energy - 1.0)
+        ratios = cache._process_ratios(mapping, _cycles(40, intercept), cycles)
+        bound = max(ratios) / min(ratios) - 1.0
+        if intercept == 0:
+            # all processes scale uniformly, thus the estimate is exact
+            assert bound == pytest.approx(0.0)
+            assert time_error == pytest.approx(0.0)
+            assert energy_error == pytest.approx(0.0)
+        elif not sequential:
+            # the makespan is the maximum processor load, which is scaled
+            # exactly, as is the dynamic energy
+            assert time_error == pytest.approx(0.0)
+            assert energy_error == pytest.approx(0.0)
+        else:
+            assert bound > 0.0
+            assert time_error <= bound + 1e-9
+            assert energy_error <= bound + 1e-9
+
+
+def test_interpolation_exceeding_max_error(monkeypatch, make_processor):
+    cache, generated, _, _ = _interpolation_setup(
+        monkeypatch, make_processor, 50, max_error=0.001
+    )
+    graph = FakeGraph(1, prbs=44)
+    cache.get_pareto_front(graph, FakeTrace(_cycles(44, 50)))
+    assert generated == [graph]
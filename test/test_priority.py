@@ -0,0 +1,101 @@
+# Copyright (C) 2021 TU Dresden
+# Licensed under the ISC license (see LICENSE.txt)
+#
+# Authors: Christian Menard
+
+from collections import deque
+
+import pytest
+
+from mocasin.simulate.scheduler import FifoScheduler
+
+from fivegsim.simulate.priority import (
+    PriorityDeadlineScheduler,
+    PriorityScheduler,
+    order_applications,
+    set_scheduler_policy,
+)
+
+
+class FakeApplication:
+    def __init__(self, priority, deadline):
+        self.priority = priority
+        self.deadline = deadline
+        self.timeout = deadline
+
+
+class FakeProcess:
+    def __init__(self, name, app):
+        self.name = name
+        self.app = app
+
+    def __repr__(self):
+        return self.name
+
+
+@pytest.fixture
+def ready_queue():
+    low = FakeApplication(priority=0, deadline=100)
+    high = FakeApplication(priority=1, deadline=300)
+    high_early = FakeApplication(priority=1, deadline=200)
+    return deque(
+        [
+            FakeProcess("low", low),
+            FakeProcess("high0", high),
+            FakeProcess("high_early", high_early),
+            FakeProcess("high1", high),
+        ]
+    )
+
+
+def _schedule(scheduler_type, ready_queue, monkeypatch):
+    # FIXME: bypasses the constructor, which requires a full system
+    scheduler = scheduler_type.__new__(scheduler_type)
+    scheduler._ready_queue = ready_queue
+    monkeypatch.setattr(
+        FifoScheduler, "schedule", lambda self: self._ready_queue[0]
+    )
+    return scheduler.schedule()
+
+
+def test_priority_scheduler(ready_queue, monkeypatch):
+    process = _schedule(PriorityScheduler, ready_queue, monkeypatch)
+    # the first process of the highest priority is selected, the others
+    # keep their order
+    assert process.name == "high0"
+    assert [p.name for p in ready_queue] == [
+        "high0",
+        "low",
+        "high_early",
+        "high1",
+    ]
+
+
+def test_priority_deadline_scheduler(ready_queue, monkeypatch):
+    process = _schedule(PriorityDeadlineScheduler, ready_queue, monkeypatch)
+    assert process.name == "high_early"
+    assert [p.name for p in ready_queue] == [
+        "high_early",
+        "low",
+        "high0",
+        "high1",
+    ]
+
+
+def test_unknown_scheduler_policy():
+    with pytest.raises(ValueError):
+        set_scheduler_policy([], "round_robin")
+
+
+@pytest.mark.parametrize(
+    "policy,order",
+    [("criticality", [1, 3, 0, 2]), ("deadline", [0, 2, 3, 1])],
+)
+def test_order_applications(policy, order):
+    graphs = [
+        FakeApplication(priority=0, deadline=100),
+        FakeApplication(priority=1, deadline=300),
+        FakeApplication(priority=0, deadline=200),
+        FakeApplication(priority=1, deadline=200),
+    ]
+    assert order_applications(graphs, policy) == order